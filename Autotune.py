@@ -0,0 +1,176 @@
+import copy
+import dataclasses
+import math
+import numpy as np
+
+from PID import PIDConfig
+from Simulation import Process, SimulationConfig
+from Sweep import score_gains
+
+# (k_p, integral time, derivative time) as fractions of the ultimate gain and period
+TUNING_RULES = {
+    "ziegler-nichols": (0.6, 0.5, 0.125),
+    "tyreus-luyben": (1/2.2, 2.2, 1/6.3),
+}
+
+# relay oscillations shorter than this many steps are the sampling limit rather than a property of the plant
+MIN_PERIOD_STEPS = 4
+
+
+@dataclasses.dataclass
+class RelayResult:
+    ultimate_gain: float
+    ultimate_period: float
+    amplitude: float
+    config: PIDConfig
+
+
+class Autotuner:
+    def __init__(self, process: Process, setpoint: float, simulation_config: SimulationConfig):
+        """
+        Finds PID gains for a plant (Transmitter, TankPlant or any Process with a batch hook). The plant is copied for
+        every experiment and left untouched. evaluations counts the plant runs used so far, a relay experiment is one
+        run and every candidate scored by optimize is one run.
+
+        :param process: plant in its initial state
+        :param setpoint: setpoint to tune for
+        :param simulation_config: run length and step size of every experiment
+        """
+        self._process = process
+        self._setpoint = setpoint
+        self._simulation_config = simulation_config
+        self.evaluations = 0
+
+    def relay(self, relay_amplitude: float = 1.0, hysteresis: float = 0.0, rule: str = "ziegler-nichols",
+              cycles: int = 4) -> RelayResult:
+        """
+        Relay feedback experiment (Astrom-Hagglund). The plant is driven with +-relay_amplitude depending on the sign
+        of the error until it oscillates in a limit cycle, the ultimate gain follows from the describing function of
+        the relay, 4*d/(pi*sqrt(a^2 - hysteresis^2)), and the ultimate period from the switching times.
+
+        Plants without lag or dead time (such as the pure integrating Transmitter) only oscillate at the sampling
+        rate, which says nothing about the plant and gives unstable gains. A RuntimeError is raised when the period is
+        under MIN_PERIOD_STEPS steps or the tuned gains do not give a stable loop (one extra evaluation), use optimize
+        for such plants.
+
+        :param relay_amplitude: relay output d
+        :param hysteresis: error band in which the relay keeps its output
+        :param rule: key of TUNING_RULES
+        :param cycles: number of full oscillations measured after the first one
+        """
+        process = copy.deepcopy(self._process)
+        delta_t = self._simulation_config.delta_t
+        self.evaluations += 1
+
+        output = relay_amplitude
+        clock = 0.0
+        switches = []
+        values = []
+        for _ in range(self._simulation_config.number_of_steps):
+            error = self._setpoint - process.value
+            if error > hysteresis and output < 0:
+                output = relay_amplitude
+                switches.append(clock)
+            elif error < -hysteresis and output > 0:
+                output = -relay_amplitude
+                switches.append(clock)
+
+            process.update(output, delta_t)
+            clock += delta_t
+            if len(switches) > 2:
+                values.append(process.value)
+            if len(switches) >= 2*cycles + 3:
+                break
+
+        if len(switches) < 2*cycles + 3:
+            raise RuntimeError("relay experiment did not reach a limit cycle within the simulation run time")
+
+        # skip the first switches, they belong to the initial transient
+        ultimate_period = float(np.mean(np.diff(switches[2::2])))
+        if ultimate_period < MIN_PERIOD_STEPS*delta_t:
+            raise RuntimeError(f"relay oscillates with a period of {ultimate_period/delta_t:.1f} steps, the plant has "
+                               f"no lag or dead time to tune from, use optimize instead")
+        amplitude = (max(values) - min(values))/2
+        ultimate_gain = 4*relay_amplitude/(math.pi*math.sqrt(max(amplitude**2 - hysteresis**2, 1e-300)))
+
+        gain_fraction, integral_fraction, derivative_fraction = TUNING_RULES[rule]
+        k_p = gain_fraction*ultimate_gain
+        config = PIDConfig(k_p=k_p, k_i=k_p/(integral_fraction*ultimate_period),
+                           k_d=k_p*derivative_fraction*ultimate_period, setpoint=self._setpoint)
+        if not np.isfinite(self.cost([[config.k_p, config.k_i, config.k_d]])[0]):
+            raise RuntimeError(f"{rule} gains from the relay experiment do not give a stable loop, use optimize instead")
+
+        return RelayResult(ultimate_gain=ultimate_gain, ultimate_period=ultimate_period, amplitude=amplitude,
+                           config=config)
+
+    def cost(self, gains: np.ndarray, overshoot_weight: float = 10.0, stop_conditions=None) -> np.ndarray:
+        """
+        Scores candidate gains in one BatchSimulation as ISE + overshoot_weight*overshoot*step size, unstable
+        candidates cost inf. The metrics come from Sweep.score_gains, so with stop_conditions every candidate is scored
+        up to its own stop and candidates stopped by Diverged cost inf.
+
+        :param gains: (M, 3) array of k_p, k_i, k_d rows
+        """
+        gains = np.asarray(gains, dtype=float).reshape(-1, 3)
+        self.evaluations += len(gains)
+
+        metrics = score_gains(self._simulation_config, self._process, self._setpoint, gains,
+                              stop_conditions=stop_conditions)
+        with np.errstate(over="ignore", invalid="ignore"):
+            step_size = abs(self._setpoint - self._process.value)
+            cost = metrics["ise"] + overshoot_weight*metrics["overshoot"]*step_size
+
+        return np.where(np.isfinite(cost), cost, np.inf)
+
+    def optimize(self, bounds=((0.0, 1.0), (0.0, 0.1), (0.0, 1.0)), initial: PIDConfig = None,
+                 population: int = 16, iterations: int = 10, elite_fraction: float = 0.25,
+                 overshoot_weight: float = 10.0, stop_conditions=None, seed=None) -> PIDConfig:
+        """
+        Minimises cost with the cross-entropy method: every iteration samples a population of gains from a normal
+        distribution, scores them together in one batch and refits the distribution to the best elite_fraction. This
+        needs population*iterations plant runs, typically a few hundred, instead of a dense grid.
+
+        :param bounds: (low, high) for k_p, k_i and k_d
+        :param initial: optional starting point, e.g. a relay result, otherwise the middle of bounds
+        :param population: candidates per iteration, all evaluated in one batch
+        :param iterations: maximum number of iterations
+        :param elite_fraction: share of each population used to refit the sampling distribution
+        :param overshoot_weight: weight of the overshoot penalty in the cost
+        :param stop_conditions: passed to BatchSimulation, e.g. StopConditions.Diverged to cut unstable runs short
+        :param seed: random seed
+        :return: best gains found, a RuntimeError is raised when every candidate was unstable
+        """
+        rng = np.random.default_rng(seed)
+        low, high = np.array(bounds, dtype=float).T
+        mean = (low + high)/2 if initial is None else np.clip([initial.k_p, initial.k_i, initial.k_d], low, high)
+        spread = (high - low)/4
+        elite_count = max(2, int(round(elite_fraction*population)))
+
+        best_gains = mean
+        best_cost = self.cost(mean[np.newaxis, :], overshoot_weight, stop_conditions)[0]
+        for _ in range(iterations):
+            candidates = np.clip(rng.normal(mean, spread, size=(population, 3)), low, high)
+            costs = self.cost(candidates, overshoot_weight, stop_conditions)
+
+            order = np.argsort(costs)
+            if costs[order[0]] < best_cost:
+                best_cost = costs[order[0]]
+                best_gains = candidates[order[0]]
+
+            # unstable candidates carry no information about where the optimum is, refit only on finite costs and
+            # keep sampling the same distribution until there are enough of them
+            finite_count = int(np.isfinite(costs).sum())
+            if finite_count < 2:
+                continue
+
+            elite = candidates[order[:min(elite_count, finite_count)]]
+            mean = elite.mean(axis=0)
+            spread = np.maximum(elite.std(axis=0), 1e-3*(high - low))
+            if np.all(spread <= 1e-2*(high - low)):
+                break
+
+        if not np.isfinite(best_cost):
+            raise RuntimeError("no stable gains found within bounds, narrow the bounds or raise iterations")
+
+        k_p, k_i, k_d = best_gains.tolist()
+        return PIDConfig(k_p=k_p, k_i=k_i, k_d=k_d, setpoint=self._setpoint)
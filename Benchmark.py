@@ -0,0 +1,251 @@
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+
+import utils
+from PID import PIDConfig, PIDController
+from Simulation import Simulation, SimulationConfig
+from TankCooler import Cooler
+from TankMonitor import CanOfSoda
+from TankPlant import TankPlant, simulate_tank
+from Transmitter import Transmitter
+
+
+def _measure(setup, steps: int, repeat: int) -> dict:
+    """
+    Times a benchmark. setup() builds fresh state and returns the callable to time, which must perform steps steps.
+    """
+    timings = []
+    for _ in range(repeat):
+        body = setup()
+        start = time.perf_counter_ns()
+        body()
+        timings.append(time.perf_counter_ns() - start)
+
+    best = min(timings)
+    return {
+        "steps": steps,
+        "repeat": repeat,
+        "best_s": best/1e9,
+        "median_s": statistics.median(timings)/1e9,
+        "ns_per_step": best/steps,
+        "steps_per_second": steps/(best/1e9),
+    }
+
+
+def _pid_output(steps: int):
+    def setup():
+        controller = PIDController(PIDConfig(k_p=0.3, k_i=0.005, k_d=0.05, setpoint=35.0))
+        output = controller.output
+
+        def body():
+            for _ in range(steps):
+                output(20.0, 0.01)
+        return body
+    return setup
+
+
+def _transmitter_update(steps: int):
+    def setup():
+        update = Transmitter(value=0.0, lag_time=5.0).update
+
+        def body():
+            for _ in range(steps):
+                update(0.1, 0.01)
+        return body
+    return setup
+
+
+def _simulation_run(run_time: float, delta_t: float):
+    def setup():
+        simulation = Simulation(SimulationConfig(run_time=run_time, delta_t=delta_t), Transmitter(value=0.0, lag_time=5.0),
+                                PIDController(PIDConfig(k_p=0.3, k_i=0.005, k_d=0.05, setpoint=35.0)))
+        return simulation.run
+    return setup
+
+
+def _cooling_function(steps: int):
+    def setup():
+        cooler = Cooler()
+        params = np.linspace(0, 1, steps).tolist()
+
+        def body():
+            for param in params:
+                cooler.cooler_param = param
+                cooler.cooling_function()
+        return body
+    return setup
+
+
+def _update_temperature(steps: int):
+    def setup():
+        can = CanOfSoda()
+        can.temperature = 0.0
+        can.external_heat_exchange = -can.internal_heater
+        can.logger.level = utils.WARNING + 1
+
+        def body():
+            for _ in range(steps):
+                can.update_temperature()
+        return body
+    return setup
+
+
+def make_tank_plant() -> TankPlant:
+    """
+    The SelfHeatingTank scenario from ResponsiveExample, without plotting.
+    """
+    can = CanOfSoda()
+    cooler = Cooler()
+    cooler.set_cooler_param(0)
+    cooler.min_cool = 3/60
+    cooler.max_cool = 7/60
+
+    can.set_external_heat(cooler.get_cooling_rate())
+    can.temperature = 48
+    can.internal_heater = 4/60
+    can.include_disturbance = False
+    can.logger.level = utils.WARNING + 1
+    return TankPlant(can, cooler, cooler_param=0, param_step=0.1)
+
+
+def _tank_setpoints(number_of_steps: int) -> np.ndarray:
+    return 21 + 5*np.cos(np.arange(number_of_steps)*2*np.pi/(60*60*24))
+
+
+def _self_heating_tank(steps: int):
+    def setup():
+        plant = make_tank_plant()
+        setpoints = _tank_setpoints(steps)
+        return lambda: simulate_tank(plant, PIDConfig(k_p=10.0, k_i=15.0, k_d=15.0), steps, 1.0, setpoint=setpoints)
+    return setup
+
+
+def _self_heating_tank_generic(steps: int):
+    def setup():
+        simulation = Simulation(SimulationConfig(run_time=steps, delta_t=1.0), make_tank_plant(),
+                                PIDController(PIDConfig(k_p=10.0, k_i=15.0, k_d=15.0, setpoint=26.0)))
+        return simulation.run
+    return setup
+
+
+# --quick divides the step counts by this
+QUICK_SCALE = 10
+
+
+def benchmarks(quick: bool = False) -> dict:
+    scale = QUICK_SCALE if quick else 1
+    tank_steps = 60*60*24 + 1
+    return {
+        "pid_output": (_pid_output(100_000//scale), 100_000//scale),
+        "transmitter_update": (_transmitter_update(100_000//scale), 100_000//scale),
+        "simulation_run_40s_10ms": (_simulation_run(40.0, 0.01), 4_000),
+        "simulation_run_400s_10ms": (_simulation_run(400.0, 0.01), 40_000),
+        f"simulation_run_{400//scale}s_1ms": (_simulation_run(400.0/scale, 0.001), 400_000//scale),
+        "cooling_function": (_cooling_function(100_000//scale), 100_000//scale),
+        "update_temperature": (_update_temperature(100_000//scale), 100_000//scale),
+        "self_heating_tank_fused": (_self_heating_tank(tank_steps), tank_steps),
+        "self_heating_tank_simulation": (_self_heating_tank_generic(tank_steps//scale), tank_steps//scale),
+    }
+
+
+def run(names=None, repeat: int = 5, quick: bool = False) -> dict:
+    results = {}
+    for name, (setup, steps) in benchmarks(quick).items():
+        if names and name not in names:
+            continue
+        results[name] = _measure(setup, steps, repeat)
+
+    return {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "scale": QUICK_SCALE if quick else 1,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.10) -> list[dict]:
+    """
+    Compares ns_per_step of every benchmark present in both result sets. A benchmark regressed if it is more than
+    threshold (as a fraction) slower than the baseline. Results of runs with different step scales (--quick) measure
+    different workloads and raise ValueError.
+    """
+    baseline_scale = baseline["meta"].get("scale", 1)
+    current_scale = current["meta"].get("scale", 1)
+    if baseline_scale != current_scale:
+        raise ValueError(f"baseline was run with step scale {baseline_scale} and current with {current_scale}, "
+                         f"rerun both with or both without --quick")
+
+    rows = []
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+        ratio = result["ns_per_step"]/baseline["results"][name]["ns_per_step"]
+        rows.append({
+            "name": name,
+            "baseline_ns_per_step": baseline["results"][name]["ns_per_step"],
+            "current_ns_per_step": result["ns_per_step"],
+            "ratio": ratio,
+            "regression": ratio > 1.0 + threshold,
+        })
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Throughput benchmarks for the simulation hot paths.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks and write the results as JSON")
+    run_parser.add_argument("--output", "-o", help="JSON file to write, stdout if omitted")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--quick", action="store_true", help="smaller step counts")
+    run_parser.add_argument("--only", nargs="*", help="benchmark names to run")
+
+    compare_parser = commands.add_parser("compare", help="compare results against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown, 0.10 = 10%%")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        results = run(args.only, args.repeat, args.quick)
+        text = json.dumps(results, indent=2)
+        if args.output:
+            with open(args.output, "w") as file:
+                file.write(text + "\n")
+        else:
+            print(text)
+        for name, result in results["results"].items():
+            print(f"{name:32s} {result['steps_per_second']:14,.0f} steps/s {result['ns_per_step']:10.1f} ns/step",
+                  file=sys.stderr)
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.current) as file:
+        current = json.load(file)
+
+    try:
+        rows = compare(baseline, current, args.threshold)
+    except ValueError as error:
+        parser.error(str(error))
+    for row in rows:
+        flag = "REGRESSION" if row["regression"] else "ok"
+        print(f"{row['name']:32s} {row['baseline_ns_per_step']:10.1f} -> {row['current_ns_per_step']:10.1f} ns/step "
+              f"({row['ratio']:5.2f}x) {flag}")
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
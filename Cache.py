@@ -0,0 +1,168 @@
+import collections
+import dataclasses
+import hashlib
+import json
+import os
+import tempfile
+import weakref
+import numpy as np
+
+from PID import PIDConfig, PIDController
+from Simulation import Simulation, SimulationConfig
+from Transmitter import Transmitter
+
+# bump whenever a change to the simulation would change the traces of an existing configuration
+MODEL_VERSION = "1"
+
+
+def _stable(value):
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return {"__type__": type(value).__name__,
+                **{field.name: _stable(getattr(value, field.name)) for field in dataclasses.fields(value)}}
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value).hex()
+    if isinstance(value, (list, tuple)):
+        return [_stable(item) for item in value]
+    if isinstance(value, (str, bool)) or value is None:
+        return value
+    raise TypeError(f"can't build a cache key from {type(value).__name__}")
+
+
+def cache_key(*values, version: str = MODEL_VERSION) -> str:
+    """
+    Stable content hash of dataclass instances (e.g. SimulationConfig, Transmitter, PIDConfig) and a model version tag.
+    Floats are hashed exactly, the key is the same across processes and sessions.
+    """
+    text = json.dumps({"version": version, "values": [_stable(value) for value in values]}, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class CachedTrace:
+    def __init__(self, time_data: np.ndarray = None, process_data: np.ndarray = None, path: str = None):
+        """
+        A cached run. Traces from the disk tier are only memory-mapped when first accessed.
+        """
+        self._time_data = time_data
+        self._process_data = process_data
+        self._path = path
+
+    def _load(self) -> None:
+        data = np.load(self._path, mmap_mode="r")
+        self._time_data = data[0]
+        self._process_data = data[1]
+
+    def detach(self) -> None:
+        """
+        Copies the traces into memory so the trace no longer needs its file, e.g. before the file is evicted.
+        """
+        if self._path is not None:
+            self._time_data = np.array(self.time_data)
+            self._process_data = np.array(self.process_data)
+            self._path = None
+
+    @property
+    def time_data(self) -> np.ndarray:
+        if self._time_data is None:
+            self._load()
+        return self._time_data
+
+    @property
+    def process_data(self) -> np.ndarray:
+        if self._process_data is None:
+            self._load()
+        return self._process_data
+
+
+class SimulationCache:
+    def __init__(self, directory: str = None, memory_entries: int = 32, disk_limit_bytes: int = 1 << 30):
+        """
+        Memoises Simulation runs by content hash. Hits are served from an in-memory LRU of memory_entries traces,
+        then from .npy files in directory (if given), which are evicted least recently used first once they exceed
+        disk_limit_bytes.
+        """
+        self._directory = directory
+        self._memory_entries = memory_entries
+        self._disk_limit_bytes = disk_limit_bytes
+        self._memory = collections.OrderedDict()
+        # every trace handed out that may still read its file lazily, also those dropped from the memory tier
+        self._lazy = weakref.WeakValueDictionary()
+        self.hits = 0
+        self.misses = 0
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._directory, key + ".npy")
+
+    def get(self, key: str):
+        trace = self._memory.get(key)
+        if trace is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return trace
+
+        if self._directory is not None and os.path.exists(self._path(key)):
+            # refresh the access time used for eviction
+            os.utime(self._path(key))
+            trace = self._lazy.get(key)
+            if trace is None:
+                trace = self._lazy[key] = CachedTrace(path=self._path(key))
+            self._remember(key, trace)
+            self.hits += 1
+            return trace
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, time_data: np.ndarray, process_data: np.ndarray) -> CachedTrace:
+        trace = CachedTrace(np.asarray(time_data), np.asarray(process_data))
+        self._remember(key, trace)
+
+        if self._directory is not None:
+            handle, temporary = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+            with os.fdopen(handle, "wb") as file:
+                np.save(file, np.stack((trace.time_data, trace.process_data)))
+            os.replace(temporary, self._path(key))
+            self._evict_disk()
+
+        return trace
+
+    def _remember(self, key: str, trace: CachedTrace) -> None:
+        self._memory[key] = trace
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self) -> None:
+        entries = []
+        for entry in os.scandir(self._directory):
+            if entry.name.endswith(".npy"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self._disk_limit_bytes:
+                break
+            # a trace still held by the memory tier or a caller may not have been loaded from this file yet
+            trace = self._lazy.pop(os.path.basename(path)[:-len(".npy")], None)
+            if trace is not None:
+                trace.detach()
+            os.remove(path)
+            total -= size
+
+    def simulate(self, simulation_config: SimulationConfig, transmitter: Transmitter,
+                 pid_config: PIDConfig) -> CachedTrace:
+        """
+        Returns the traces of Simulation(simulation_config, transmitter, PIDController(pid_config)), running it only
+        if no identical run is cached. transmitter is not modified.
+        """
+        key = cache_key(simulation_config, transmitter, pid_config)
+        trace = self.get(key)
+        if trace is None:
+            simulation = Simulation(simulation_config, Transmitter(value=transmitter.value, lag_time=transmitter.lag_time),
+                                    PIDController(pid_config))
+            simulation.run()
+            trace = self.put(key, simulation.time_data, simulation.process_data)
+        return trace
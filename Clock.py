@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+def seconds_of_day(timestamp: datetime) -> float:
+    """
+    :return: seconds since midnight of timestamp, the time base of the 24 hour target cycle
+    """
+
+    return timestamp.hour * 3600 + timestamp.minute * 60 + timestamp.second + timestamp.microsecond / 1e6
+
+
+class RealClock:
+    lockstep = False
+
+    def __init__(self):
+        """
+
+        Wall clock time, the default for the live examples.
+
+        """
+
+        self._start = time.monotonic()
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def time(self) -> float:
+        """
+        :return: seconds elapsed since the clock was created
+        """
+
+        return time.monotonic() - self._start
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+    async def sleep_async(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+
+class ScaledClock:
+    lockstep = False
+
+    def __init__(self, scale: float, start: datetime = None):
+        """
+
+        Wall clock time sped up by scale, e.g. scale=1000 runs a 24 hour cycle in under 90 s. Sleeps are shortened by
+        the same factor.
+
+        :param scale: virtual seconds per real second
+        :param start: virtual time at creation, defaults to now
+        """
+
+        self.scale = scale
+        self._start = start if start is not None else datetime.now()
+        self._real_start = time.monotonic()
+
+    def now(self) -> datetime:
+        return self._start + timedelta(seconds=self.time())
+
+    def time(self) -> float:
+        return (time.monotonic() - self._real_start) * self.scale
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds / self.scale)
+
+    async def sleep_async(self, seconds: float):
+        await asyncio.sleep(seconds / self.scale)
+
+
+class SteppedClock:
+    lockstep = True
+
+    def __init__(self, start: datetime = None):
+        """
+
+        As-fast-as-possible virtual time. The clock only moves when sleep is called, which returns immediately, so a
+        run replays deterministically and a 24 hour cycle takes as long as the computation. lockstep tells producers
+        (CanOfSoda.run) to wait until their readings have been consumed before moving the clock on.
+
+        :param start: virtual time at creation, defaults to midnight today
+        """
+
+        if start is None:
+            start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self._start = start
+        self._elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def now(self) -> datetime:
+        return self._start + timedelta(seconds=self.time())
+
+    def time(self) -> float:
+        with self._lock:
+            return self._elapsed
+
+    def sleep(self, seconds: float):
+        with self._lock:
+            self._elapsed += seconds
+
+    async def sleep_async(self, seconds: float):
+        """
+        Advances the clock and yields once to the event loop, so other tasks see every step.
+        """
+
+        self.sleep(seconds)
+        await asyncio.sleep(0)
@@ -0,0 +1,58 @@
+import math
+import numpy as np
+
+
+def min_max(x_data: np.ndarray, y_data: np.ndarray, number_of_buckets: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Splits the trace into equal buckets and keeps the lowest and highest point of each in their original order, so
+    every peak survives. Returns at most 2*number_of_buckets points, the trace is returned unchanged if it is shorter.
+    """
+    x_data = np.asarray(x_data)
+    y_data = np.asarray(y_data)
+    if len(y_data) <= 2*number_of_buckets:
+        return x_data, y_data
+
+    bucket_size = math.ceil(len(y_data)/number_of_buckets)
+    number_of_buckets = math.ceil(len(y_data)/bucket_size)
+    padded = np.full(number_of_buckets*bucket_size, np.nan)
+    padded[:len(y_data)] = y_data
+    buckets = padded.reshape(number_of_buckets, bucket_size)
+
+    offsets = np.arange(number_of_buckets)*bucket_size
+    low = np.nanargmin(buckets, axis=1) + offsets
+    high = np.nanargmax(buckets, axis=1) + offsets
+
+    index = np.unique(np.concatenate((low, high)))
+    return x_data[index], y_data[index]
+
+
+def lttb(x_data: np.ndarray, y_data: np.ndarray, number_of_points: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Largest-Triangle-Three-Buckets downsampling to number_of_points points. The first and last points are always kept
+    and every bucket in between keeps the point that spans the largest triangle with its neighbours, which preserves
+    the visual shape (peaks, overshoot) of the trace.
+    """
+    x_data = np.asarray(x_data, dtype=float)
+    y_data = np.asarray(y_data, dtype=float)
+    length = len(y_data)
+    if number_of_points >= length or number_of_points < 3:
+        return x_data, y_data
+
+    edges = np.linspace(1, length - 1, number_of_points - 1).astype(int)
+    index = np.empty(number_of_points, dtype=int)
+    index[0] = 0
+    index[-1] = length - 1
+
+    selected = 0
+    for i in range(number_of_points - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_start, next_stop = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (length - 1, length)
+        average_x = x_data[next_start:next_stop].mean()
+        average_y = y_data[next_start:next_stop].mean()
+
+        area = np.abs((x_data[selected] - average_x)*(y_data[start:stop] - y_data[selected])
+                      - (x_data[selected] - x_data[start:stop])*(average_y - y_data[selected]))
+        selected = start + int(np.argmax(area))
+        index[i + 1] = selected
+
+    return x_data[index], y_data[index]
@@ -0,0 +1,154 @@
+import bisect
+import time
+
+# 1 us to 10 s, four buckets per decade
+DEFAULT_BOUNDS_NS = tuple(int(round(10 ** (3 + i / 4))) for i in range(29))
+
+
+class LatencyHistogram:
+    __slots__ = ("bounds_ns", "counts", "count", "total_ns", "max_ns")
+
+    def __init__(self, bounds_ns=DEFAULT_BOUNDS_NS):
+        """
+
+        Fixed-bucket latency histogram, recording is a bisect and a few integer updates.
+
+        :param bounds_ns: ascending bucket upper bounds in ns, values above the last bound go in an overflow bucket
+        """
+
+        self.bounds_ns = tuple(bounds_ns)
+        self.counts = [0] * (len(self.bounds_ns) + 1)
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, value_ns):
+        self.counts[bisect.bisect_left(self.bounds_ns, value_ns)] += 1
+        self.count += 1
+        self.total_ns += value_ns
+        if value_ns > self.max_ns:
+            self.max_ns = value_ns
+
+    def percentile(self, fraction) -> int:
+        """
+
+        :param fraction: 0-1
+        :return: upper bound (ns) of the bucket holding the given fraction of samples, max_ns for the overflow bucket
+        """
+
+        if not self.count:
+            return 0
+        target = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return self.bounds_ns[index] if index < len(self.bounds_ns) else self.max_ns
+        return self.max_ns
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ns": self.total_ns / self.count if self.count else 0.0,
+            "p50_ns": self.percentile(0.50),
+            "p99_ns": self.percentile(0.99),
+            "max_ns": self.max_ns,
+        }
+
+
+class Span:
+    __slots__ = ("histogram", "_start")
+
+    def __init__(self, histogram: LatencyHistogram):
+        """
+
+        Reusable timing context manager, records the time spent inside the with block into histogram.
+
+        """
+
+        self.histogram = histogram
+        self._start = 0
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.histogram.record(time.perf_counter_ns() - self._start)
+        return False
+
+
+class LoopInstrumentation:
+    def __init__(self, period, summary_interval=None, export=None, bounds_ns=DEFAULT_BOUNDS_NS):
+        """
+
+        Latency and jitter instrumentation for a periodic control loop.
+
+        Wrap each stage of an iteration in span(name), and mark iterations with start_iteration/end_iteration. Busy
+        time, the jitter between iteration starts and the age of each consumed sample go into histograms. An iteration
+        whose busy time exceeds the period counts as a deadline miss.
+
+        :param period: expected loop period in seconds
+        :param summary_interval: if set with export, export(summary()) is called at most once per this many seconds
+        :param export: callable receiving the summary dict
+        :param bounds_ns: histogram bucket bounds
+        """
+
+        self.period_ns = int(period * 1e9)
+        self.summary_interval_ns = int(summary_interval * 1e9) if summary_interval is not None else None
+        self.export = export
+        self._bounds_ns = bounds_ns
+
+        self.spans = {}
+        self.busy = LatencyHistogram(bounds_ns)
+        self.jitter = LatencyHistogram(bounds_ns)
+        self.sample_age = LatencyHistogram(bounds_ns)
+        self.iterations = 0
+        self.deadline_misses = 0
+
+        self._iteration_start = None
+        self._last_export = time.perf_counter_ns()
+
+    def span(self, name) -> Span:
+        span = self.spans.get(name)
+        if span is None:
+            span = self.spans[name] = Span(LatencyHistogram(self._bounds_ns))
+        return span
+
+    def start_iteration(self):
+        now = time.perf_counter_ns()
+        if self._iteration_start is not None:
+            self.jitter.record(abs(now - self._iteration_start - self.period_ns))
+        self._iteration_start = now
+
+    def end_iteration(self):
+        now = time.perf_counter_ns()
+        busy = now - self._iteration_start
+        self.busy.record(busy)
+        if busy > self.period_ns:
+            self.deadline_misses += 1
+        self.iterations += 1
+
+        if self.export is not None and self.summary_interval_ns is not None \
+                and now - self._last_export >= self.summary_interval_ns:
+            self._last_export = now
+            self.export(self.summary())
+
+    def record_sample_age(self, published_ns):
+        """
+
+        :param published_ns: perf_counter_ns() at which the consumed sample was produced
+        """
+
+        self.sample_age.record(time.perf_counter_ns() - published_ns)
+
+    def summary(self) -> dict:
+        return {
+            "iterations": self.iterations,
+            "deadline_misses": self.deadline_misses,
+            "period_ns": self.period_ns,
+            "busy": self.busy.summary(),
+            "jitter": self.jitter.summary(),
+            "sample_age": self.sample_age.summary(),
+            "spans": {name: span.histogram.summary() for name, span in self.spans.items()},
+        }
@@ -0,0 +1,134 @@
+import collections
+import time
+import matplotlib
+import matplotlib.pyplot as plt
+
+
+class LiveMonitor:
+    def __init__(self, critical_temperature: float, window: float = 600.0, frame_rate: float = 10.0,
+                 backend: str = "TkAgg"):
+        """
+
+        Incremental live plot of a monitored tank. Every artist is created once and updated through set_data, frames are
+        blitted over a cached background, only the last window seconds are kept, and redraws are throttled to
+        frame_rate independently of how often update is called. A full redraw only happens when the data leaves the
+        current axis limits.
+
+        :param critical_temperature: tank critical temperature, drawn as a line plus the warning band
+        :param window: seconds of history shown
+        :param frame_rate: maximum redraws per second
+        :param backend: matplotlib backend to switch to, None keeps the current one
+        """
+
+        if backend is not None:
+            matplotlib.use(backend)
+        plt.ion()
+        plt.style.use("bmh")
+
+        self._fig, self._ax = plt.subplots(figsize=(3*3, 2*3))
+        self._ax.set_xlabel("Time(s)")
+        self._ax.set_ylabel("Temperature (C)")
+        self._ax.set_title("PID Controller Simulation \n Heated Can (monitored) with Cooler")
+
+        self._temperature_line, = self._ax.plot([], [], color="b", label="System Temperature", animated=True)
+        self._target_line, = self._ax.plot([], [], color="g", linestyle="--", label="Target Temperature",
+                                           animated=True)
+        self._ax.axhline(critical_temperature, color="r", linestyle="--",
+                         label=f"Critical Temperature: {critical_temperature:0.1f}$\\degree$C")
+        self._ax.axhspan(critical_temperature*0.75, critical_temperature*1.10, color="r", alpha=0.25)
+        self._readout = self._ax.text(0.99, 0.02, "", transform=self._ax.transAxes, ha="right", va="bottom",
+                                      animated=True)
+        self._ax.legend(loc="upper left")
+
+        self._critical_temperature = critical_temperature
+        self._window = window
+        self._frame_period = 1.0/frame_rate
+        self._last_draw = float("-inf")
+
+        self._times = collections.deque()
+        self._temperatures = collections.deque()
+        self._targets = collections.deque()
+
+        self._background = None
+        self._fig.canvas.mpl_connect("draw_event", self._on_draw)
+
+        plt.show(block=False)
+        plt.pause(0.001)
+
+    def update(self, t: float, temperature: float, target: float) -> bool:
+        """
+
+        Adds a sample and redraws if the frame period has elapsed.
+
+        :param t: sample time (s)
+        :param temperature: tank temperature (C)
+        :param target: target temperature (C)
+        :return: True if the figure was redrawn
+        """
+
+        self._times.append(t)
+        self._temperatures.append(temperature)
+        self._targets.append(target)
+        while self._times[0] < t - self._window:
+            self._times.popleft()
+            self._temperatures.popleft()
+            self._targets.popleft()
+
+        now = time.perf_counter()
+        if now - self._last_draw < self._frame_period:
+            return False
+        self._last_draw = now
+
+        self.redraw()
+        return True
+
+    def redraw(self) -> None:
+        if not self._times:
+            return
+
+        self._temperature_line.set_data(self._times, self._temperatures)
+        self._target_line.set_data(self._times, self._targets)
+        self._readout.set_text(f"System: {self._temperatures[-1]:0.1f}$\\degree$C   "
+                               f"Target: {self._targets[-1]:0.1f}$\\degree$C")
+
+        if self._rescale() or self._background is None:
+            # new limits change the ticks, the background has to be rebuilt; _on_draw blits the artists
+            self._fig.canvas.draw()
+        else:
+            self._fig.canvas.restore_region(self._background)
+            self._draw_artists()
+            self._fig.canvas.blit(self._fig.bbox)
+
+        self._fig.canvas.flush_events()
+
+    def _rescale(self) -> bool:
+        rescaled = False
+
+        latest = self._times[-1]
+        x_low, x_high = self._ax.get_xlim()
+        if latest > x_high or self._background is None:
+            # jump the right edge ahead by a fifth of the window so the axis only moves every few frames
+            x_high = latest + 0.2*self._window
+            self._ax.set_xlim(x_high - self._window, x_high)
+            rescaled = True
+
+        low = min(min(self._temperatures), min(self._targets))
+        high = max(max(self._temperatures), max(self._targets))
+        y_low, y_high = self._ax.get_ylim()
+        if low < y_low or high > y_high or self._background is None:
+            low = min(low, self._critical_temperature*0.75)
+            high = max(high, self._critical_temperature*1.10)
+            padding = 0.1*(high - low)
+            self._ax.set_ylim(low - padding, high + padding)
+            rescaled = True
+
+        return rescaled
+
+    def _draw_artists(self) -> None:
+        self._ax.draw_artist(self._temperature_line)
+        self._ax.draw_artist(self._target_line)
+        self._ax.draw_artist(self._readout)
+
+    def _on_draw(self, event) -> None:
+        self._background = self._fig.canvas.copy_from_bbox(self._fig.bbox)
+        self._draw_artists()
@@ -0,0 +1,163 @@
+import dataclasses
+import numpy as np
+
+
+@dataclasses.dataclass
+class PerformanceMetrics:
+    ise: float
+    iae: float
+    itae: float
+    overshoot: float
+    crossing_time: float
+    rise_time: float
+    settling_time: float
+
+
+def _first_true(mask: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    found = mask.any(axis=-1)
+    return np.argmax(mask, axis=-1), found
+
+
+def compute_metrics(time_data: np.ndarray, process_data: np.ndarray, setpoint, initial_value,
+                    settling_band: float = 0.02, number_of_samples=None) -> dict[str, np.ndarray]:
+    """
+    Scores step responses against their setpoint. Works on a single trace or on (N, number_of_steps) batches, the
+    scores come back with the leading shape of process_data. Rise and settling times that are never reached are NaN.
+
+    :param time_data: sample times, same shape as process_data
+    :param process_data: process values
+    :param setpoint: setpoint per trace
+    :param initial_value: process value per trace before the run started
+    :param settling_band: fraction of the step size the process must stay within to count as settled
+    :param number_of_samples: optional number of leading samples to score per trace, later samples are ignored, e.g.
+        a BatchSimulation row's steps_taken so rows that stopped early are scored up to their own stop
+    """
+    time_data = np.asarray(time_data, dtype=float)
+    process_data = np.asarray(process_data, dtype=float)
+    setpoint = np.asarray(setpoint, dtype=float)[..., np.newaxis]
+    initial_value = np.asarray(initial_value, dtype=float)[..., np.newaxis]
+    delta_t = np.diff(time_data, axis=-1, prepend=0.0)
+    delta_t[..., 0] = delta_t[..., 1] if time_data.shape[-1] > 1 else 0.0
+
+    error = setpoint - process_data
+    step = setpoint - initial_value
+    direction = np.where(step < 0.0, -1.0, 1.0)
+    progress = direction*(process_data - initial_value)
+    step_size = np.abs(step)
+
+    length = process_data.shape[-1]
+    if number_of_samples is not None:
+        count = np.asarray(number_of_samples)[..., np.newaxis]
+        valid = np.arange(length) < count
+        error = np.where(valid, error, 0.0)
+        delta_t = np.where(valid, delta_t, 0.0)
+        progress = np.where(valid, progress, -np.inf)
+    else:
+        count = np.full(process_data.shape[:-1] + (1,), length)
+        valid = True
+
+    ise = np.sum(error**2*delta_t, axis=-1)
+    iae = np.sum(np.abs(error)*delta_t, axis=-1)
+    itae = np.sum(time_data*np.abs(error)*delta_t, axis=-1)
+    overshoot = np.maximum(np.max(np.where(valid, -direction*error, -np.inf), axis=-1), 0.0)
+
+    crossing_index, crossed = _first_true(progress >= step_size)
+    crossing_time = np.where(crossed, np.take_along_axis(time_data, crossing_index[..., np.newaxis], axis=-1)[..., 0], np.nan)
+
+    rise_start, started = _first_true(progress >= 0.1*step_size)
+    rise_end, finished = _first_true(progress >= 0.9*step_size)
+    rise_time = np.where(
+        started & finished,
+        np.take_along_axis(time_data, rise_end[..., np.newaxis], axis=-1)[..., 0]
+        - np.take_along_axis(time_data, rise_start[..., np.newaxis], axis=-1)[..., 0],
+        np.nan)
+
+    outside = np.abs(error) > settling_band*step_size
+    last_outside = length - 1 - np.argmax(outside[..., ::-1], axis=-1)
+    settle_index = np.where(outside.any(axis=-1), last_outside + 1, 0)
+    settled = settle_index < count[..., 0]
+    settling_time = np.where(
+        settled,
+        np.take_along_axis(time_data, np.minimum(settle_index, length - 1)[..., np.newaxis], axis=-1)[..., 0],
+        np.nan)
+
+    return {
+        "ise": ise,
+        "iae": iae,
+        "itae": itae,
+        "overshoot": overshoot,
+        "crossing_time": crossing_time,
+        "rise_time": rise_time,
+        "settling_time": settling_time,
+    }
+
+
+def score(time_data: np.ndarray, process_data: np.ndarray, setpoint: float, initial_value: float,
+          settling_band: float = 0.02) -> PerformanceMetrics:
+    metrics = compute_metrics(time_data, process_data, setpoint, initial_value, settling_band)
+    return PerformanceMetrics(**{name: float(value) for name, value in metrics.items()})
+
+
+class StreamingMetrics:
+    def __init__(self, setpoint: float, initial_value: float, settling_band: float = 0.02):
+        """
+
+        Accumulates the same scores as compute_metrics one sample at a time, without keeping the trace. Every update is
+        O(1) in time and memory.
+
+        :param setpoint: setpoint of the run
+        :param initial_value: process value before the run started
+        :param settling_band: fraction of the step size the process must stay within to count as settled
+        """
+        self._setpoint = setpoint
+        self._initial_value = initial_value
+        self._direction = -1.0 if setpoint < initial_value else 1.0
+        self._step_size = abs(setpoint - initial_value)
+        self._band = settling_band*self._step_size
+
+        self._ise = 0.0
+        self._iae = 0.0
+        self._itae = 0.0
+        self._overshoot = 0.0
+        self._crossing_time = float("nan")
+        self._rise_start = float("nan")
+        self._rise_time = float("nan")
+        self._settling_time = float("nan")
+
+    def update(self, time: float, value: float, dt: float) -> None:
+        error = self._setpoint - value
+        abs_error = abs(error)
+
+        self._ise += error*error*dt
+        self._iae += abs_error*dt
+        self._itae += time*abs_error*dt
+
+        excess = -self._direction*error
+        if excess > self._overshoot:
+            self._overshoot = excess
+
+        if self._rise_time != self._rise_time:
+            progress = self._direction*(value - self._initial_value)
+            if self._rise_start != self._rise_start and progress >= 0.1*self._step_size:
+                self._rise_start = time
+            if progress >= 0.9*self._step_size:
+                self._rise_time = time - self._rise_start
+
+        if self._crossing_time != self._crossing_time and excess >= 0.0:
+            self._crossing_time = time
+
+        if abs_error > self._band:
+            self._settling_time = float("nan")
+        elif self._settling_time != self._settling_time:
+            self._settling_time = time
+
+    def result(self) -> PerformanceMetrics:
+        return PerformanceMetrics(
+            ise=self._ise,
+            iae=self._iae,
+            itae=self._itae,
+            overshoot=self._overshoot,
+            crossing_time=self._crossing_time,
+            rise_time=self._rise_time,
+            settling_time=self._settling_time,
+        )
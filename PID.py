@@ -1,4 +1,5 @@
 import dataclasses
+import numpy as np
 
 @dataclasses.dataclass
 class PIDConfig:
@@ -6,22 +7,287 @@ class PIDConfig:
     k_i: float = 0.
     k_d: float = 0.0
     setpoint: float = 0.0
+    # output is clamped to [lower_bound, upper_bound] only when lower_bound < upper_bound
     lower_bound: float = 0.0
     upper_bound: float = 0.0
 
 class PIDController:
+    __slots__ = ("_config", "error", "integral_error", "derivate_error",
+                 "_k_p", "_k_i", "_k_d", "_setpoint", "_clamped", "_lower_bound", "_upper_bound")
+
     def __init__(self, config: PIDConfig):
-        self._config = config
+        """
+        The controller keeps its own copy of config, so controllers built from one PIDConfig don't share a
+        setpoint. After changing config, assign it again (controller.config = config) or set controller.setpoint.
+
+        When config has bounds the output is clamped and the integral is held while the output is saturated and
+        the error would drive it further out (conditional integration).
+        """
         self.error = 0.0
         self.integral_error = 0.0
         self.derivate_error = 0.0
+        self.config = config
+
+    @property
+    def config(self) -> PIDConfig:
+        return self._config
+
+    @config.setter
+    def config(self, config: PIDConfig) -> None:
+        config = dataclasses.replace(config)
+        self._config = config
+        self._k_p = config.k_p
+        self._k_i = config.k_i
+        self._k_d = config.k_d
+        self._setpoint = config.setpoint
+        self._clamped = config.lower_bound < config.upper_bound
+        self._lower_bound = config.lower_bound
+        self._upper_bound = config.upper_bound
+
+    @property
+    def setpoint(self) -> float:
+        return self._setpoint
+
+    @setpoint.setter
+    def setpoint(self, setpoint: float) -> None:
+        self._config.setpoint = setpoint
+        self._setpoint = setpoint
+
+    def snapshot(self) -> dict:
+        """
+        Config and loop state as plain values, see restore.
+        """
+        return {"config": dataclasses.asdict(self._config), "error": self.error,
+                "integral_error": self.integral_error, "derivate_error": self.derivate_error}
+
+    def restore(self, state: dict) -> None:
+        self.config = PIDConfig(**state["config"])
+        self.error = state["error"]
+        self.integral_error = state["integral_error"]
+        self.derivate_error = state["derivate_error"]
+
+    def fork(self) -> "PIDController":
+        """
+        Independent controller with a copy of the config and the same loop state.
+        """
+        controller = PIDController(self._config)
+        controller.restore(self.snapshot())
+        return controller
 
     def output(self, process_var: float,  dt: float) -> float:
-        previous_error = self.error
-        self.error = self._config.setpoint - process_var
-        self.integral_error += self.error *dt
-        self.derivate_error = (self.error - previous_error)/dt
+        error = self._setpoint - process_var
+        integral_error = self.integral_error + error*dt
+        self.derivate_error = (error - self.error)/dt
+        self.error = error
+
+        output = self._k_p*error + self._k_i*integral_error + self._k_d*self.derivate_error
+
+        if self._clamped:
+            if output > self._upper_bound:
+                if self._k_i*error > 0:
+                    integral_error = self.integral_error
+                output = self._upper_bound
+            elif output < self._lower_bound:
+                if self._k_i*error < 0:
+                    integral_error = self.integral_error
+                output = self._lower_bound
+
+        self.integral_error = integral_error
+
+        return output
+
+
+class Controller:
+    __slots__ = ("setpoint", "conditional_integration", "bound_control", "error", "integral_error",
+                 "derivate_error", "_k_p", "_k_i", "_k_d", "_lower_bound", "_upper_bound", "_step_size",
+                 "_derivative_filter", "_filter_alpha", "_tracking_gain", "_tracking")
+
+    def __init__(self, Kp: float = 0.0, Ki: float = 0.0, Kd: float = 0.0, setpoint: float = 0.0,
+                 step_size: float = 1.0, bounds=(-np.inf, np.inf), derivative_filter: float = 0.0,
+                 tracking_gain: float = 0.0):
+        """
+
+        Fixed rate PID for live loops, calc() advances it by step_size.
+
+        :param Kp: proportional gain
+        :param Ki: integral gain
+        :param Kd: derivative gain
+        :param setpoint: target process value
+        :param step_size: time between calc() calls (s)
+        :param bounds: (lower, upper) output limits, applied when bound_control is set
+        :param derivative_filter: time constant (s) of the first order low pass on the derivative, 0 for none
+        :param tracking_gain: back-calculation gain, bleeds the integral by the clamped amount while saturated
+        """
+        self.setpoint = setpoint
+        self.conditional_integration = False
+        self.bound_control = False
+        self.error = 0.0
+        self.integral_error = 0.0
+        self.derivate_error = 0.0
+
+        self._k_p = Kp
+        self._k_i = Ki
+        self._k_d = Kd
+        self._step_size = step_size
+        self._derivative_filter = derivative_filter
+        self._tracking_gain = tracking_gain
+        self.bounds = bounds
+        self._update_cache()
+
+    def _update_cache(self) -> None:
+        self._filter_alpha = self._step_size/(self._derivative_filter + self._step_size)
+        self._tracking = self._tracking_gain/self._k_i if self._k_i else 0.0
+
+    @property
+    def Kp(self) -> float:
+        return self._k_p
+
+    @Kp.setter
+    def Kp(self, value: float) -> None:
+        self._k_p = value
+
+    @property
+    def Ki(self) -> float:
+        return self._k_i
+
+    @Ki.setter
+    def Ki(self, value: float) -> None:
+        self._k_i = value
+        self._update_cache()
+
+    @property
+    def Kd(self) -> float:
+        return self._k_d
+
+    @Kd.setter
+    def Kd(self, value: float) -> None:
+        self._k_d = value
+
+    @property
+    def step_size(self) -> float:
+        return self._step_size
+
+    @step_size.setter
+    def step_size(self, value: float) -> None:
+        self._step_size = value
+        self._update_cache()
+
+    @property
+    def derivative_filter(self) -> float:
+        return self._derivative_filter
+
+    @derivative_filter.setter
+    def derivative_filter(self, value: float) -> None:
+        self._derivative_filter = value
+        self._update_cache()
+
+    @property
+    def tracking_gain(self) -> float:
+        return self._tracking_gain
+
+    @tracking_gain.setter
+    def tracking_gain(self, value: float) -> None:
+        self._tracking_gain = value
+        self._update_cache()
+
+    @property
+    def bounds(self) -> tuple[float, float]:
+        return self._lower_bound, self._upper_bound
+
+    @bounds.setter
+    def bounds(self, bounds) -> None:
+        lower_bound, upper_bound = bounds
+        if lower_bound > upper_bound:
+            raise ValueError(f"lower bound {lower_bound} is above upper bound {upper_bound}")
+        self._lower_bound = float(lower_bound)
+        self._upper_bound = float(upper_bound)
+
+    def reset(self) -> None:
+        self.error = 0.0
+        self.integral_error = 0.0
+        self.derivate_error = 0.0
+
+    def calc(self, process_var: float) -> float:
+        step_size = self._step_size
+        error = self.setpoint - process_var
+        integral_error = self.integral_error + error*step_size
+        self.derivate_error += self._filter_alpha*((error - self.error)/step_size - self.derivate_error)
+        self.error = error
+
+        output = self._k_p*error + self._k_i*integral_error + self._k_d*self.derivate_error
+
+        if self.bound_control:
+            if output > self._upper_bound:
+                saturation = self._upper_bound - output
+            elif output < self._lower_bound:
+                saturation = self._lower_bound - output
+            else:
+                saturation = 0.0
+
+            if saturation:
+                # hold the integral while the error pushes further into saturation
+                if self.conditional_integration and self._k_i*error*saturation < 0:
+                    integral_error = self.integral_error
+                integral_error += self._tracking*saturation*step_size
+                output += saturation
+
+        self.integral_error = integral_error
+
+        return output
+
+
+class PIDControllerBank:
+    def __init__(self, configs: list[PIDConfig]):
+        self.k_p = np.array([config.k_p for config in configs], dtype=float)
+        self.k_i = np.array([config.k_i for config in configs], dtype=float)
+        self.k_d = np.array([config.k_d for config in configs], dtype=float)
+        self.setpoint = np.array([config.setpoint for config in configs], dtype=float)
+        self.lower_bound = np.array([config.lower_bound for config in configs], dtype=float)
+        self.upper_bound = np.array([config.upper_bound for config in configs], dtype=float)
+        self.clamped = self.lower_bound < self.upper_bound
+        self.enabled = np.ones(len(configs), dtype=bool)
+
+        self.error = np.zeros(len(configs))
+        self.integral_error = np.zeros(len(configs))
+        self.derivate_error = np.zeros(len(configs))
+
+    def __len__(self) -> int:
+        return len(self.setpoint)
+
+    def output(self, process_vars: np.ndarray, dt) -> np.ndarray:
+        """
+        Advances every loop by one tick. Disabled loops keep their state and output 0.
+
+        :param process_vars: process value per loop
+        :param dt: step size, a scalar or one per loop
+        """
+        error = self.setpoint - process_vars
+        integral_error = self.integral_error + error*dt
+
+        if self.enabled.all():
+            derivate_error = (error - self.error)/dt
+        else:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                derivate_error = (error - self.error)/dt
+            error = np.where(self.enabled, error, self.error)
+            integral_error = np.where(self.enabled, integral_error, self.integral_error)
+            derivate_error = np.where(self.enabled, derivate_error, self.derivate_error)
+
+        output = self.k_p*error + self.k_i*integral_error + self.k_d*derivate_error
+
+        if self.clamped.any():
+            above = self.clamped & (output > self.upper_bound)
+            below = self.clamped & (output < self.lower_bound)
+            # same conditional integration as PIDController
+            hold = (above & (self.k_i*error > 0)) | (below & (self.k_i*error < 0))
+            integral_error = np.where(hold, self.integral_error, integral_error)
+            output = np.where(above, self.upper_bound, np.where(below, self.lower_bound, output))
+
+        self.error = error
+        self.integral_error = integral_error
+        self.derivate_error = derivate_error
 
-        output = self._config.k_p*self.error + self._config.k_i*self.integral_error + self._config.k_d*self.derivate_error
+        if not self.enabled.all():
+            output[~self.enabled] = 0.0
 
         return output
@@ -1,8 +1,18 @@
-import matplotlib.pyplot as plt
 import numpy as np
 
+import Downsample
+
 class Plotter:
-    def __init__(self, setpoint: float = 0.0):
+    def __init__(self, setpoint: float = 0.0, max_points: int = None, method: str = "minmax"):
+        """
+        :param setpoint: setpoint drawn as a reference line
+        :param max_points: traces longer than this are downsampled before plotting, None picks two points per
+            horizontal pixel of the figure and 0 plots every point
+        :param method: downsampling method, "minmax" or "lttb"
+        """
+        # imported here so headless runs never load matplotlib
+        import matplotlib.pyplot as plt
+
         self._fig, self._ax = plt.subplots(figsize=(3 * 3, 2 * 3))
         self._ax.axhline(y=setpoint, color='r', linestyle='--', label=f'Setpoint: {setpoint}')
         self._ax.set_xlabel("Time(s)")
@@ -10,10 +20,28 @@ class Plotter:
         self._ax.set_title("PID Controller Simulation")
         self._fig.legend()
 
+        if max_points is None:
+            max_points = 2 * int(self._fig.get_figwidth() * self._fig.dpi)
+        self._max_points = max_points
+        self._method = method
+
+    def _downsample(self, x_data: np.ndarray, y_data: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        if not self._max_points or len(y_data) <= self._max_points:
+            return x_data, y_data
+        if self._method == "lttb":
+            return Downsample.lttb(x_data, y_data, self._max_points)
+        return Downsample.min_max(x_data, y_data, self._max_points // 2)
+
     def add_plot(self, x_data: np.ndarray, y_data: np.ndarray, label: str) -> None:
-        self._ax.plot(x_data, y_data, label=label)
+        self._ax.plot(*self._downsample(x_data, y_data), label=label)
         self._fig.legend()
 
     def show(self) -> None:
+        import matplotlib.pyplot as plt
+
         self._fig.legend()
         plt.show()
+
+    def save(self, path: str, **kwargs) -> None:
+        self._fig.legend()
+        self._fig.savefig(path, **kwargs)
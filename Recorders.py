@@ -0,0 +1,176 @@
+import abc
+import math
+import numpy as np
+
+
+class Recorder(abc.ABC):
+    """
+    Receives every (time, value) sample from a Simulation and decides what to keep.
+    """
+
+    @abc.abstractmethod
+    def record(self, time: float, value: float) -> None: ...
+
+    @property
+    @abc.abstractmethod
+    def time_data(self) -> np.ndarray: ...
+
+    @property
+    @abc.abstractmethod
+    def process_data(self) -> np.ndarray: ...
+
+
+class ArrayRecorder(Recorder):
+    def __init__(self, number_of_steps: int):
+        """
+        Keeps every sample in memory, the default Simulation behaviour.
+
+        :param number_of_steps: number of samples that will be recorded
+        """
+        self._time_data = np.ndarray(number_of_steps)
+        self._process_data = np.ndarray(number_of_steps)
+        self._count = 0
+
+    def record(self, time: float, value: float) -> None:
+        self._time_data[self._count] = time
+        self._process_data[self._count] = value
+        self._count += 1
+
+    @property
+    def time_data(self) -> np.ndarray:
+        return self._time_data[:self._count]
+
+    @property
+    def process_data(self) -> np.ndarray:
+        return self._process_data[:self._count]
+
+
+class DecimatingRecorder(ArrayRecorder):
+    def __init__(self, number_of_steps: int, every: int):
+        """
+        Keeps every k-th sample, starting with the first.
+
+        :param number_of_steps: number of samples the simulation will produce
+        :param every: keep one sample out of this many
+        """
+        super().__init__(math.ceil(number_of_steps/every))
+        self._every = every
+        self._seen = 0
+
+    def record(self, time: float, value: float) -> None:
+        if self._seen % self._every == 0:
+            super().record(time, value)
+        self._seen += 1
+
+
+class MinMaxRecorder(Recorder):
+    def __init__(self, number_of_steps: int, bucket_size: int):
+        """
+        Splits the run into buckets of bucket_size samples and keeps the lowest and highest sample of each, so peaks and
+        overshoot survive the decimation. Each bucket yields two points in time order.
+
+        :param number_of_steps: number of samples the simulation will produce
+        :param bucket_size: samples per bucket
+        """
+        number_of_buckets = math.ceil(number_of_steps/bucket_size)
+        self._min_time = np.ndarray(number_of_buckets)
+        self._min_value = np.ndarray(number_of_buckets)
+        self._max_time = np.ndarray(number_of_buckets)
+        self._max_value = np.ndarray(number_of_buckets)
+        self._bucket_size = bucket_size
+        self._seen = 0
+
+    def record(self, time: float, value: float) -> None:
+        bucket, position = divmod(self._seen, self._bucket_size)
+        if position == 0 or value < self._min_value[bucket]:
+            self._min_time[bucket] = time
+            self._min_value[bucket] = value
+        if position == 0 or value > self._max_value[bucket]:
+            self._max_time[bucket] = time
+            self._max_value[bucket] = value
+        self._seen += 1
+
+    def _interleaved(self) -> tuple[np.ndarray, np.ndarray]:
+        number_of_buckets = math.ceil(self._seen/self._bucket_size)
+        min_first = self._min_time[:number_of_buckets] <= self._max_time[:number_of_buckets]
+
+        time_data = np.empty((number_of_buckets, 2))
+        process_data = np.empty((number_of_buckets, 2))
+        time_data[:, 0] = np.where(min_first, self._min_time[:number_of_buckets], self._max_time[:number_of_buckets])
+        time_data[:, 1] = np.where(min_first, self._max_time[:number_of_buckets], self._min_time[:number_of_buckets])
+        process_data[:, 0] = np.where(min_first, self._min_value[:number_of_buckets], self._max_value[:number_of_buckets])
+        process_data[:, 1] = np.where(min_first, self._max_value[:number_of_buckets], self._min_value[:number_of_buckets])
+
+        return time_data.ravel(), process_data.ravel()
+
+    @property
+    def time_data(self) -> np.ndarray:
+        return self._interleaved()[0]
+
+    @property
+    def process_data(self) -> np.ndarray:
+        return self._interleaved()[1]
+
+
+class RingBufferRecorder(Recorder):
+    def __init__(self, duration: float, delta_t: float):
+        """
+        Keeps only the most recent duration seconds of samples in a fixed size buffer.
+
+        :param duration: length of the retained window in seconds
+        :param delta_t: simulation step size
+        """
+        capacity = math.ceil(duration/delta_t)
+        self._time_data = np.ndarray(capacity)
+        self._process_data = np.ndarray(capacity)
+        self._capacity = capacity
+        self._count = 0
+
+    def record(self, time: float, value: float) -> None:
+        index = self._count % self._capacity
+        self._time_data[index] = time
+        self._process_data[index] = value
+        self._count += 1
+
+    def _ordered(self, data: np.ndarray) -> np.ndarray:
+        if self._count <= self._capacity:
+            return data[:self._count]
+        start = self._count % self._capacity
+        return np.concatenate((data[start:], data[:start]))
+
+    @property
+    def time_data(self) -> np.ndarray:
+        return self._ordered(self._time_data)
+
+    @property
+    def process_data(self) -> np.ndarray:
+        return self._ordered(self._process_data)
+
+
+class MemmapRecorder(Recorder):
+    def __init__(self, path: str, number_of_steps: int):
+        """
+        Writes every sample straight to a (2, number_of_steps) float64 file on disk, row 0 is time and row 1 the
+        process. Reopen the file with np.memmap(path, dtype=np.float64, mode="r", shape=(2, number_of_steps)).
+
+        :param path: file to create, overwritten if it exists
+        :param number_of_steps: number of samples that will be recorded
+        """
+        self._data = np.memmap(path, dtype=np.float64, mode="w+", shape=(2, number_of_steps))
+        self._count = 0
+
+    def record(self, time: float, value: float) -> None:
+        self._data[0, self._count] = time
+        self._data[1, self._count] = value
+        self._count += 1
+
+    def flush(self) -> None:
+        self._data.flush()
+
+    @property
+    def time_data(self) -> np.ndarray:
+        return self._data[0, :self._count]
+
+    @property
+    def process_data(self) -> np.ndarray:
+        return self._data[1, :self._count]
@@ -1,45 +1,45 @@
+import Clock
 import TankCooler
 import TankMonitor
+import Instrumentation
 import PID
+import Setpoints
+import TankPlant
 import numpy as np
-import matplotlib
-import matplotlib.pyplot as plt
 import threading
-import time
 
 
-def GetTargetTemperature(t=0, method="flat", tank_time=0):
+# target temperature schedules used by GetTargetTemperature
+TARGET_24HOUR = Setpoints.Sinusoidal(mean=21, amplitude=5, period=Setpoints.DAY)
+TARGET_FLAT = Setpoints.Constant(27)
+
+
+def GetTargetTemperature(t=0, method="flat", tank_time=0, clock=None):
     """
 
     Returns the target temperature for the system.
 
-    :param t: current time
+    :param t: current time, or an array of times for a whole target trajectory
     :param method: If 24hour will return a target temperature based on a 24 hour cycle and param t.
     Else, returns a flat value.
     :param tank_time: The time associated with the simultaneously running TankMonitor object. Requires t=0.
+    :param clock: If given, the current time of day (seconds since midnight) is read from this Clock and used as
+        tank_time.
 
     """
 
-    # only a bit of DNR going on here, I'm coming up on my self-imposed timelimit...
+    if clock is not None:
+        tank_time = Clock.seconds_of_day(clock.now())
 
-    if tank_time == 0:
-        if method == "24hour":
-            period = 60 * 60 * 24  # 24 hours, 60*24 minutes, 60*24*60 seconds.
-            w = 2*np.pi/period
-            return 21+5*np.cos((t-0)*w)
-        else:
-            return 27
-    else:
-        if method == "24hour":
-            period = 60 * 60 * 24  # 24 hours, 60*24 minutes, 60*24*60 seconds.
-            w = 2*np.pi/period
-            return 21+5*np.cos((tank_time-0)*w)
-        else:
-            return 27
+    schedule = TARGET_24HOUR if method == "24hour" else TARGET_FLAT
+    time = t if tank_time == 0 else tank_time
+    if np.ndim(time):
+        return schedule.values(time)
+    return schedule.at(time)
 
 
 # example 2
-def SelfHeatingTank():
+def SelfHeatingTank(plot=True, duration=Setpoints.DAY, pid_config=None):
     """
     Stepping up from the direct process value control, this example adds in an abstraction layer.
 
@@ -57,34 +57,20 @@ def SelfHeatingTank():
 
     We will also make use of a 24hour cycle for setting the temperature target. This is to simulate cooling the tank
         to ambient external temperature that changes over the course of the day.
-    """
-
-    def ProcessFunction(cooler_param) -> float:
-        """
-        Internal function
-        Connects the cooler to the tank and returns the current temperature. Necessary for PID controller.
-
-        :param cooler_param:
-        :return:
-        """
-
-        cooler.set_cooler_param(cooler_param)
-        can.set_external_heat(cooler.get_cooling_rate())
-        can.update_temperature()
-
-        return can.get_temperature()
 
-
-    print_to_console = False
+    :param plot: show the result, matplotlib is only imported when set
+    :param duration: simulated time (s), a day by default
+    :param pid_config: controller gains and bounds, defaults to the tuned, clamped config below
+    :return: time, temperature, target temperature and cooler param arrays
+    """
 
     # Object setup
-    target_temperature = GetTargetTemperature(method="24hour")
-
     can = TankMonitor.CanOfSoda()
     cooler = TankCooler.Cooler()
 
-    controller = PID.Controller(Kp=10.0, Ki=15.0, Kd=15.0, setpoint=target_temperature)
-    controller.conditional_integration = True
+    # the output is clamped like LiveSystem's controller, which holds the integral while saturated so it can't wind up
+    if pid_config is None:
+        pid_config = PID.PIDConfig(k_p=10.0, k_i=15.0, k_d=15.0, lower_bound=-10.0, upper_bound=10.0)
 
     # initial conditions
     process_val = 0
@@ -98,75 +84,55 @@ def SelfHeatingTank():
     can.internal_heater = 4/60
     can.include_disturbance = False
 
+    # The controller output is in the temperature domain, so it can't be handed to the cooler directly. TankPlant
+    # backs the cooler param out of it: a positive control (tank colder than the target) slows the pump down by 0.1,
+    # otherwise the pump is sped up by 0.1.
+    plant = TankPlant.TankPlant(can, cooler, cooler_param=process_val, param_step=0.1)
+
     # set up time array and iteration params
     dt = 1
-    t_end = 60*60*24  # seconds
+    t_end = duration  # seconds
     time_array = np.arange(0, t_end+dt, dt)
-    controller.step_size = dt
+    target_vals = TARGET_24HOUR.values(time_array)
 
-    # tracking arrays
-    cooler_vals = []
-    target_vals = []
+    # control loop, fused into a single pass over the time array
+    temp_history, cooler_vals = TankPlant.simulate_tank(plant, pid_config, len(time_array), dt, setpoint=target_vals)
 
+    if plot:
+        import matplotlib.pyplot as plt
 
-    # control loop
-    for t in time_array:
-        controller.setpoint = GetTargetTemperature(t=t)
-        current_temp = ProcessFunction(cooler_param=process_val)
-        control = controller.calc(process_var=current_temp)
-
-        # We need to back out the control_param from the control output.
-        # If control is positive, that means the system is hotter than the target, therefore we need
-        #   to increase the speed of the pump (process_val -= 0.1)
-        # if the control is negative, that means the system is cooler than the target, therefore we need to
-        #   slow down the pump. (process_val += 0.1)
-        # because the error is calculated by reference to the measured value (temp) we cannot shove the mechanism
-        # control variable into the PID, the domains are different.
-
-        # I'm trying not to overthink it here, but I could pass the ProcessFunction into the controller and have
-        # a controller parameter that switches between direct process_var and abstracted method_var...
-
-        if control > 0:
-            process_val -= 0.1
-            if process_val > cooler.param_range[1]:
-                process_val = cooler.param_range[1]
-        else:
-            process_val += 0.1
-            if process_val < cooler.param_range[0]:
-                process_val = cooler.param_range[0]
-
-        if print_to_console:
-            system_error = control - current_temp
-            print(f">>> Control out: {control}\n"
-                  f">>> Process out: {current_temp}\n"
-                  f">>> System Error: {system_error}\n"
-                  f">>> process_val: {process_val}")
-
-        target_vals.append(GetTargetTemperature(t=t))
-        cooler_vals.append(process_val)
+        plt.style.use("bmh")
 
-    temp_history = can.temperature_history
-    plt.style.use("bmh")
+        fig, ax = plt.subplots(layout="constrained", figsize=(3 * 3, 2 * 3))
 
-    fig, ax = plt.subplots(layout="constrained", figsize=(3 * 3, 2 * 3))
+        ax.plot(time_array, temp_history, label='System Temperature', color="b")
+        ax.plot(time_array, target_vals, color='r', linestyle='--', label=f"Target Temperature")
+        ax.set_xlabel("Time(s)")
+        ax.set_ylabel("Temperature (C)")
+        ax.set_title("PID Controller Simulation \n Heated Can")
 
-    ax.plot(time_array, temp_history, label='System Temperature', color="b")
-    ax.plot(time_array, target_vals, color='r', linestyle='--', label=f"Target Temperature")
-    ax.set_xlabel("Time(s)")
-    ax.set_ylabel("Temperature (C)")
-    ax.set_title("PID Controller Simulation \n Heated Can")
+        plt.legend()
+        plt.show()
 
-    plt.legend()
-    plt.show()
+    return time_array, temp_history, target_vals, cooler_vals
 
 # example 3
-def LiveSystem():
+def LiveSystem(clock=None, instrumentation=None, plot=True, duration=None, verbose=True):
     """
 
     This example steps up from example 2 by having the TankMonitor run in real time, have a time delay between gauge
     readings, and automatically adjusts the gain variables
 
-    :return:
+    :param clock: Clock driving the tank and the target temperature, defaults to real time. Pass a ScaledClock or
+        SteppedClock to replay the system faster than real time.
+    :param instrumentation: Instrumentation.LoopInstrumentation recording loop latencies, by default one with the
+        tank's report interval as period and no export hook is created.
+    :param plot: show the live monitor, matplotlib/Tk is only imported when set
+    :param duration: stop after this many seconds of tank time, measured from the reading timestamps, None runs
+        forever. The tank thread is stopped before returning.
+    :param verbose: print every control correction
+    :return: time (s since the first reading), temperature, target temperature and cooler param lists, once duration
+        is reached
     """
 
     def ProcessFunction(cooler_param) -> float:
@@ -187,72 +153,18 @@ def LiveSystem():
 
         return ret_val
 
-    def StartVisualMonitor():
-        """
-
-        Starts the interactive plotting.
-
-        :return: figure and axis for reference.
-        """
-        matplotlib.use('TkAgg')
-        plt.ion()
-        plt.style.use("bmh")
-        _fig, _ax = plt.subplots(figsize=(3*3, 2*3))
-        _ax.set_xlabel("Time(s)")
-        _ax.set_ylabel("Temperature (C)")
-        _ax.set_title("PID Controller Simulation \n Heated Can (monitored)")
-
-
-
-        plt.show()
-
-        return _fig, _ax
-
-    def UpdateVisualMonitor(data_dict):
-        """
-
-        Updates the potting figure with monitor information
-
-        :param data_dict: dictionary containing the data to plot
-        :return:
-        """
-
-        t_array = data_dict["time_array"]
-        temperature_array = data_dict["temp_history"]
-        target_values = data_dict["target_vals"]
-
-        ax.clear()
-
-        ax.plot(t_array, temperature_array, color="b",
-                label=f'System Temperature: {temperature_array[-1]:0.1f}$\degree$C')
-
-        ax.plot(t_array, target_values, color='g', linestyle='--',
-                label=f"Target Temperature: {target_values[-1]:0.1f}$\degree$C")
-
-        ax.axhline(data_dict['critical temp'], color='r', linestyle='--',
-                   label=f"Critical Temperature: {data_dict['critical temp']:0.1f}$\degree$C")
-
-        ax.axhspan(data_dict['critical temp']*0.75, data_dict['critical temp']*1.10, color='r', alpha=0.25)
-
-        ax.autoscale_view()
-
-
-        ax.set_xlabel("Time(s)")
-        ax.set_ylabel("Temperature (C)")
-        ax.set_title("PID Controller Simulation \n Heated Can (monitored) with Cooler")
-
-
-        plt.legend(loc="upper left")
-        fig.canvas.draw()
-        fig.canvas.flush_events()
-
     def launch_tankmonitor():
-        can.run()
+        can.run(stop=stop)
 
-    target_temperature = GetTargetTemperature(method="24hour")
+    if clock is None:
+        clock = Clock.RealClock()
+
+    target_temperature = GetTargetTemperature(method="24hour", clock=clock)
 
     can = TankMonitor.CanOfSoda()
+    can.clock = clock
     cooler = TankCooler.Cooler()
+    cooler.logger.clock = clock
 
     controller = PID.Controller(Kp=20.0, Ki=5.0, Kd=0.5, setpoint=target_temperature)
     controller.conditional_integration = True
@@ -267,7 +179,8 @@ def LiveSystem():
     cooler.set_cooler_param(process_val)
     cooler.min_cool = 40.0 / 60.0
     cooler.max_cool = 80.0 / 60.0
-    cooler.toggle_debug()
+    if verbose:
+        cooler.toggle_debug()
 
 
     can.set_external_heat(cooler.get_cooling_rate())
@@ -284,76 +197,96 @@ def LiveSystem():
 
     # setup threading
     lock = threading.Lock()
+    stop = threading.Event()
     MonitorThread = threading.Thread(target=launch_tankmonitor, daemon=True)
     MonitorThread.start()
 
     # setup monitor figure
-    fig, ax = StartVisualMonitor()
+    monitor = None
+    if plot:
+        import LiveMonitor
+        monitor = LiveMonitor.LiveMonitor(critical_temperature=can.critical_temperature)
+
+    start_time = None
 
-    initial_step = True
+    # loop instrumentation
+    if instrumentation is None:
+        instrumentation = Instrumentation.LoopInstrumentation(period=can.report_interval)
+    acquire_span = instrumentation.span("acquire")
+    actuator_span = instrumentation.span("actuator")
+    calc_span = instrumentation.span("calc")
+    plot_span = instrumentation.span("plot")
 
     # control loop
-    while True:
-        with lock:
+    while duration is None or not time_array or time_array[-1] < duration:
+        # blocks until the TankMonitor publishes a reading
+        with acquire_span:
             TankReadings = can.GetLiveReading()
-            TankTemperature = TankReadings["temperature"]
-        if np.isnan(TankTemperature):
-            # We are between sample points, we need to let the TankMonitor operate
-            time.sleep(can.dt)
-        else:
-            # we are at the sample point, we can obtain the current_temperature, and apply control corrections.
-            _target_temp = GetTargetTemperature(tank_time=TankReadings["time"].second)
-            controller.setpoint = _target_temp
+
+        instrumentation.start_iteration()
+        instrumentation.record_sample_age(TankReadings.published_ns)
+
+        # we are at the sample point, we can obtain the current_temperature, and apply control corrections.
+        _target_temp = GetTargetTemperature(tank_time=Clock.seconds_of_day(TankReadings.time))
+        controller.setpoint = _target_temp
+        with actuator_span:
             current_temp = ProcessFunction(cooler_param=process_val)
+        with calc_span:
             control = controller.calc(process_var=current_temp)
 
-            # We need to back out the control_param from the control output.
-            # If control is positive, that means the system is hotter than the target, therefore we need
-            #   to increase the speed of the pump (process_val -= 0.1)
-            # if the control is negative, that means the system is cooler than the target, therefore we need to
-            #   slow down the pump. (process_val += 0.1)
-            # because the error is calculated by reference to the measured value (temp) we cannot shove the mechanism
-            # control variable into the PID, the domains are different.
+        # We need to back out the control_param from the control output.
+        # If control is positive, that means the system is hotter than the target, therefore we need
+        #   to increase the speed of the pump (process_val -= 0.1)
+        # if the control is negative, that means the system is cooler than the target, therefore we need to
+        #   slow down the pump. (process_val += 0.1)
+        # because the error is calculated by reference to the measured value (temp) we cannot shove the mechanism
+        # control variable into the PID, the domains are different.
 
-            # I'm trying not to overthink it here, but I could pass the ProcessFunction into the controller and have
-            # a controller parameter that switches between direct process_var and abstracted method_var...
+        # I'm trying not to overthink it here, but I could pass the ProcessFunction into the controller and have
+        # a controller parameter that switches between direct process_var and abstracted method_var...
 
-            if control < 0:
+        if control < 0:
+            if verbose:
                 print(f"control implies over temp, increasing strength of heat transfer: {control}")
-                process_val += 0.1
-                if process_val > cooler.param_range[1]:
-                    process_val = cooler.param_range[1]
-            else:
+            process_val += 0.1
+            if process_val > cooler.param_range[1]:
+                process_val = cooler.param_range[1]
+        else:
+            if verbose:
                 print(f"control implies under temp, decreasing strength of heat transfer: {control}")
-                process_val -= 0.1  # realistically values should be tied to the magintude of the control var
-                if process_val < cooler.param_range[0]:
-                    process_val = cooler.param_range[0]
+            process_val -= 0.1  # realistically values should be tied to the magintude of the control var
+            if process_val < cooler.param_range[0]:
+                process_val = cooler.param_range[0]
+
 
+        # update trackers
+        target_vals.append(_target_temp)
+        cooler_vals.append(process_val)
+        temperature_vals.append(current_temp)
 
-            # update trackers
-            target_vals.append(_target_temp)
-            cooler_vals.append(process_val)
-            temperature_vals.append(current_temp)
+        if start_time is None:
+            start_time = TankReadings.time
+        time_array.append((TankReadings.time - start_time).total_seconds())
 
-            if initial_step:
-                time_array.append(dt)
-                initial_step = False
-            else:
-                time_array.append(time_array[-1]+dt)
 
+        # update figure, redraws are throttled by the monitor
+        if monitor is not None:
+            with plot_span:
+                monitor.update(time_array[-1], current_temp, _target_temp)
 
-            plot_dict = {
-                "time_array": time_array,
-                "temp_history": temperature_vals,
-                "target_vals": target_vals,
-                "cooler_vals": cooler_vals,
-                "critical temp": TankReadings["critical temp"]
-            }
+        instrumentation.end_iteration()
 
+        # lets a lockstep clock move on to the next reading
+        can.readings.task_done()
 
-            # update figure
-            UpdateVisualMonitor(data_dict=plot_dict)
+    # stop the tank, draining readings so a lockstep clock isn't left waiting for them to be consumed
+    stop.set()
+    while MonitorThread.is_alive():
+        if can.GetLiveReading(timeout=0.01) is not None:
+            can.readings.task_done()
 
+    return time_array, temperature_vals, target_vals, cooler_vals
 
 
-LiveSystem()
+if __name__ == "__main__":
+    LiveSystem()
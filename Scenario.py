@@ -0,0 +1,163 @@
+import argparse
+import dataclasses
+import json
+import os
+import sys
+
+import numpy as np
+
+import Clock
+import Instrumentation
+import ResponsiveExample
+import Setpoints
+import TankMonitor
+from Metrics import score
+from PID import PIDConfig, PIDController
+from Simulation import Simulation, SimulationConfig
+from Transmitter import Transmitter
+
+# the BasicExample tunes, used when a basic scenario doesn't list its own
+DEFAULT_TUNES = {
+    "high_integral": {"k_p": 0.25, "k_i": 0.1, "k_d": 0.1},
+    "well_tuned": {"k_p": 0.3, "k_i": 0.005, "k_d": 0.05},
+}
+
+
+def _check_keys(scenario: dict, keys: set[str]) -> None:
+    unknown = set(scenario) - {"name", "type"} - keys
+    if unknown:
+        raise ValueError(f"unknown keys {sorted(unknown)} for a {scenario['type']!r} scenario, expected {sorted(keys)}")
+
+
+def run_basic(scenario: dict, plot: bool = False) -> tuple[dict, dict]:
+    """
+    BasicExample: one Simulation of a Transmitter per tune.
+
+    Scenario keys (all optional): setpoint, run_time, delta_t, initial_value, lag_time and tunes, a mapping of tune
+    name to PIDConfig fields.
+    """
+    _check_keys(scenario, {"setpoint", "run_time", "delta_t", "initial_value", "lag_time", "tunes"})
+    setpoint = scenario.get("setpoint", 35.0)
+    initial_value = scenario.get("initial_value", 0.0)
+    simulation_config = SimulationConfig(run_time=scenario.get("run_time", 400.0),
+                                         delta_t=scenario.get("delta_t", 0.01))
+
+    arrays = {}
+    summary = {}
+    for tune_name, gains in scenario.get("tunes", DEFAULT_TUNES).items():
+        transmitter = Transmitter(value=initial_value, lag_time=scenario.get("lag_time", 5.0))
+        simulation = Simulation(simulation_config, transmitter, PIDController(PIDConfig(setpoint=setpoint, **gains)))
+        simulation.run()
+        arrays[f"{tune_name}_time"] = simulation.time_data
+        arrays[f"{tune_name}_process"] = simulation.process_data
+        summary[tune_name] = dataclasses.asdict(
+            score(simulation.time_data, simulation.process_data, setpoint, initial_value))
+
+    if plot:
+        from Plotter import Plotter
+        plotter = Plotter(setpoint=setpoint)
+        for tune_name in summary:
+            plotter.add_plot(arrays[f"{tune_name}_time"], arrays[f"{tune_name}_process"], tune_name)
+        plotter.show()
+
+    return arrays, summary
+
+
+def run_self_heating_tank(scenario: dict, plot: bool = False) -> tuple[dict, dict]:
+    """
+    ResponsiveExample.SelfHeatingTank, a simulated day of the tank.
+
+    Scenario keys (all optional): duration (s, default a day) and gains, PIDConfig fields replacing the example's
+    tuned config.
+    """
+    _check_keys(scenario, {"duration", "gains"})
+    pid_config = PIDConfig(**scenario["gains"]) if "gains" in scenario else None
+    time_data, temperature_data, target_data, param_data = ResponsiveExample.SelfHeatingTank(
+        plot=plot, duration=scenario.get("duration", Setpoints.DAY), pid_config=pid_config)
+    arrays = {"time": time_data, "temperature": temperature_data, "target": target_data, "cooler_param": param_data}
+    summary = {"max_abs_error": float(np.abs(temperature_data - target_data).max())}
+    return arrays, summary
+
+
+def run_live(scenario: dict, plot: bool = False) -> tuple[dict, dict]:
+    """
+    ResponsiveExample.LiveSystem for a fixed duration.
+
+    Scenario keys (all optional): duration (s, default 3600), clock ("stepped", "scaled" or "real", default stepped)
+    and scale for the scaled clock.
+    """
+    _check_keys(scenario, {"duration", "clock", "scale"})
+    clock_name = scenario.get("clock", "stepped")
+    if clock_name == "stepped":
+        clock = Clock.SteppedClock()
+    elif clock_name == "scaled":
+        clock = Clock.ScaledClock(scenario.get("scale", 60.0))
+    elif clock_name == "real":
+        clock = Clock.RealClock()
+    else:
+        raise ValueError(f"unknown clock {clock_name!r}")
+
+    # readings arrive once per report interval, so that is the loop's deadline
+    instrumentation = Instrumentation.LoopInstrumentation(period=TankMonitor.REPORT_INTERVAL)
+    time_data, temperature_data, target_data, param_data = ResponsiveExample.LiveSystem(
+        clock=clock, instrumentation=instrumentation, plot=plot, duration=scenario.get("duration", 3600.0),
+        verbose=False)
+
+    arrays = {"time": np.array(time_data), "temperature": np.array(temperature_data),
+              "target": np.array(target_data), "cooler_param": np.array(param_data)}
+    summary = {"max_abs_error": float(np.abs(arrays["temperature"] - arrays["target"]).max()),
+               "instrumentation": instrumentation.summary()}
+    return arrays, summary
+
+
+SCENARIOS = {
+    "basic": run_basic,
+    "self_heating_tank": run_self_heating_tank,
+    "live": run_live,
+}
+
+
+def run(scenarios: list[dict], output: str, plot: bool = False, names=None) -> dict:
+    """
+    Runs scenarios (dicts with a name, a type from SCENARIOS and the type's own keys) and writes each one's arrays to
+    <output>/<name>.npz and all summaries to <output>/summary.json.
+    """
+    os.makedirs(output, exist_ok=True)
+    summaries = {}
+    for scenario in scenarios:
+        name = scenario.get("name", scenario["type"])
+        if names and name not in names:
+            continue
+        if scenario["type"] not in SCENARIOS:
+            raise ValueError(f"unknown scenario type {scenario['type']!r}, expected one of {sorted(SCENARIOS)}")
+
+        arrays, summary = SCENARIOS[scenario["type"]](scenario, plot)
+        np.savez(os.path.join(output, f"{name}.npz"), **arrays)
+        summaries[name] = {"type": scenario["type"], "file": f"{name}.npz", **summary}
+
+    with open(os.path.join(output, "summary.json"), "w") as file:
+        file.write(json.dumps(summaries, indent=2) + "\n")
+    return summaries
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Runs example scenarios from a JSON file, headless by default.")
+    parser.add_argument("scenario_file", help='JSON file holding {"scenarios": [...]} or a list of scenarios')
+    parser.add_argument("--output", "-o", default="results", help="directory the results are written to")
+    parser.add_argument("--plot", action="store_true", help="show plots, imports matplotlib")
+    parser.add_argument("--only", nargs="*", help="scenario names to run")
+    args = parser.parse_args(argv)
+
+    with open(args.scenario_file) as file:
+        scenarios = json.load(file)
+    if isinstance(scenarios, dict):
+        scenarios = scenarios["scenarios"]
+
+    summaries = run(scenarios, args.output, args.plot, args.only)
+    for name, summary in summaries.items():
+        print(f"{name:24s} {summary['type']:20s} -> {os.path.join(args.output, summary['file'])}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import abc
+import bisect
+import math
+import numpy as np
+
+DAY = 60 * 60 * 24  # s
+
+
+class Schedule(abc.ABC):
+    """
+    Setpoint as a function of time. at(time) gives one value for a live loop, values(times) fills a whole time grid in
+    one vectorised call for Simulation, BatchSimulation and simulate_tank.
+    """
+
+    @abc.abstractmethod
+    def at(self, time: float) -> float: ...
+
+    @abc.abstractmethod
+    def values(self, times) -> np.ndarray: ...
+
+
+class Constant(Schedule):
+    def __init__(self, value: float):
+        self.value = value
+
+    def at(self, time: float) -> float:
+        return self.value
+
+    def values(self, times) -> np.ndarray:
+        return np.full(np.shape(times), self.value, dtype=float)
+
+
+class Sinusoidal(Schedule):
+    def __init__(self, mean: float, amplitude: float, period: float = DAY, phase: float = 0.0):
+        """
+        mean + amplitude*cos(2*pi*(time - phase)/period), peaking at time = phase.
+
+        :param mean: average setpoint
+        :param amplitude: swing either side of mean
+        :param period: length of one cycle (s), a day by default
+        :param phase: time of the peak (s)
+        """
+        self.mean = mean
+        self.amplitude = amplitude
+        self.period = period
+        self.phase = phase
+        self._angular_frequency = 2*np.pi/period
+
+    def at(self, time: float) -> float:
+        return self.mean + self.amplitude*math.cos((time - self.phase)*self._angular_frequency)
+
+    def values(self, times) -> np.ndarray:
+        return self.mean + self.amplitude*np.cos((np.asarray(times, dtype=float) - self.phase)*self._angular_frequency)
+
+
+class Piecewise(Schedule):
+    def __init__(self, times, values):
+        """
+        Steps between levels: values[k] holds from times[k] until times[k + 1], values[0] also applies before times[0].
+
+        :param times: ascending switch times (s)
+        :param values: setpoint from each switch time on
+        """
+        self.times = np.asarray(times, dtype=float)
+        self.values_at_times = np.asarray(values, dtype=float)
+        if self.times.shape != self.values_at_times.shape or not len(self.times):
+            raise ValueError("times and values must be non-empty and of the same length")
+        self._times = self.times.tolist()
+        self._values = self.values_at_times.tolist()
+
+    def at(self, time: float) -> float:
+        return self._values[max(bisect.bisect_right(self._times, time) - 1, 0)]
+
+    def values(self, times) -> np.ndarray:
+        index = np.searchsorted(self.times, np.asarray(times, dtype=float), side="right") - 1
+        return self.values_at_times[np.maximum(index, 0)]
+
+
+class Tabulated(Schedule):
+    def __init__(self, times, values, period: float = None):
+        """
+        Linear interpolation between tabulated points, held constant outside them.
+
+        :param times: ascending sample times (s)
+        :param values: setpoint at each sample time
+        :param period: if set the table repeats with this period (s), e.g. DAY for a daily profile
+        """
+        self.times = np.asarray(times, dtype=float)
+        self.values_at_times = np.asarray(values, dtype=float)
+        if self.times.shape != self.values_at_times.shape or not len(self.times):
+            raise ValueError("times and values must be non-empty and of the same length")
+        self.period = period
+        self._times = self.times.tolist()
+        self._values = self.values_at_times.tolist()
+
+    def at(self, time: float) -> float:
+        if self.period is not None:
+            return float(self.values(time))
+
+        index = bisect.bisect_right(self._times, time)
+        if index == 0:
+            return self._values[0]
+        if index == len(self._times):
+            return self._values[-1]
+        start, end = self._times[index - 1], self._times[index]
+        return self._values[index - 1] + (self._values[index] - self._values[index - 1])*(time - start)/(end - start)
+
+    def values(self, times) -> np.ndarray:
+        return np.interp(np.asarray(times, dtype=float), self.times, self.values_at_times, period=self.period)
+
+
+class Ramp(Tabulated):
+    def __init__(self, start_time: float, end_time: float, start_value: float, end_value: float):
+        """
+        Holds start_value until start_time, ramps linearly to end_value at end_time and holds it from then on.
+        """
+        super().__init__((start_time, end_time), (start_value, end_value))
@@ -1,8 +1,15 @@
+import copy
 import dataclasses
+import functools
 import math
+import typing
 import numpy as np
 
-from PID import PIDController
+from Metrics import PerformanceMetrics, StreamingMetrics, score
+from PID import PIDConfig, PIDController, PIDControllerBank
+from Recorders import ArrayRecorder, Recorder
+from Setpoints import Schedule
+from StopConditions import StopCondition
 from Transmitter import Transmitter
 
 
@@ -15,13 +22,364 @@ class SimulationConfig:
     def number_of_steps(self) -> int:
         return math.ceil(self.run_time/self.delta_t)
 
+class Process(typing.Protocol):
+    """
+    Anything Simulation can drive: a measured value and an update that applies the controller output over dt.
+    Transmitter and TankPlant.TankPlant both qualify. BatchSimulation additionally needs a static batch(processes)
+    returning an object with a value array and a vectorised update, and Simulation.checkpoint/restore/fork need
+    snapshot() -> dict, restore(state) and fork().
+    """
+
+    value: float
+
+    def update(self, new_value: float, dt: float) -> None: ...
+
+
+@dataclasses.dataclass
+class SimulationCheckpoint:
+    """
+    Mid-run state of a Simulation as plain values and arrays, so it can be pickled and restored in another process.
+    """
+    clock: float
+    steps_taken: int
+    process: dict
+    controller: dict
+    time_data: np.ndarray = None
+    process_data: np.ndarray = None
+    metrics: StreamingMetrics = None
+
+
 class Simulation:
-    def __init__(self, config: SimulationConfig, process: Transmitter, controller: PIDController):
+    def __init__(self, config: SimulationConfig, process: Process, controller: PIDController,
+                 metrics_only: bool = False, recorder: Recorder = None, stop_conditions: list[StopCondition] = None,
+                 setpoint: Schedule = None):
+        """
+        :param setpoint: optional setpoint schedule, evaluated once over the whole time grid up front and fed to the
+            controller step by step, the controller's own setpoint is used when None. Step response metrics need a
+            constant setpoint and are not available with a schedule.
+        """
+        if setpoint is not None and metrics_only:
+            raise ValueError("metrics_only needs a constant setpoint, it can't be combined with a setpoint schedule")
+
         self._config = config
         self._process = process
         self._controller = controller
+        self._stop_conditions = list(stop_conditions) if stop_conditions else []
+        self._setpoints = None
+        if setpoint is not None:
+            self._setpoints = setpoint.values(np.arange(config.number_of_steps)*config.delta_t).tolist()
+            controller.setpoint = self._setpoints[0]
 
         self._clock = 0.0
+        self._initial_value = process.value
+        self._steps_taken = 0
+        self._stop_reason = None
+
+        if metrics_only:
+            # scores are accumulated while stepping and no traces are kept
+            self._metrics = StreamingMetrics(controller.config.setpoint, process.value)
+            self._recorder = None
+        else:
+            self._metrics = None
+            self._recorder = recorder if recorder is not None else ArrayRecorder(config.number_of_steps)
+
+    @property
+    def process(self) -> Process:
+        return self._process
+
+    @property
+    def controller(self) -> PIDController:
+        return self._controller
+
+    @property
+    def recorder(self) -> Recorder:
+        return self._recorder
+
+    @property
+    def time_data(self) -> np.ndarray:
+        return self._recorder.time_data if self._recorder is not None else None
+    
+    @property
+    def process_data(self) -> np.ndarray:
+        return self._recorder.process_data if self._recorder is not None else None
+
+    @property
+    def metrics(self) -> PerformanceMetrics:
+        if self._setpoints is not None:
+            raise ValueError("step response metrics need a constant setpoint, score the traces against the schedule")
+        if self._metrics is not None:
+            return self._metrics.result()
+        return score(self.time_data, self.process_data, self._controller.config.setpoint, self._initial_value)
+
+    @property
+    def steps_taken(self) -> int:
+        return self._steps_taken
+
+    @property
+    def stop_reason(self) -> str:
+        """
+        "completed" when every step ran, "paused" when run was limited to fewer steps, otherwise the reason of the stop
+        condition that ended the run.
+        """
+        return self._stop_reason
+
+    def _should_stop(self, time: float, value: float) -> bool:
+        setpoint = self._controller.config.setpoint
+        for condition in self._stop_conditions:
+            if condition.check(time, value, setpoint, self._config.delta_t):
+                self._stop_reason = condition.reason
+                return True
+        return False
+    
+    def run(self, steps: int = None) -> None:
+        """
+        Runs to the end of the configured time, or at most steps further steps. A run that was paused, restored or
+        forked continues where it left off.
+        """
+        if self._steps_taken == 0:
+            for condition in self._stop_conditions:
+                condition.reset()
+        self._stop_reason = None
+
+        end = self._config.number_of_steps
+        if steps is not None:
+            end = min(end, self._steps_taken + steps)
+
+        if self._metrics is not None:
+            self._run_metrics_only(end)
+        else:
+            record = self._recorder.record
+            stop_conditions = self._stop_conditions
+            setpoints = self._setpoints
+            step = self._steps_taken
+            for step in range(self._steps_taken + 1, end + 1):
+                if setpoints is not None:
+                    self._controller.setpoint = setpoints[step - 1]
+                output = self._controller.output(self._process.value, self._config.delta_t)
+                self._process.update(output, self._config.delta_t)
+
+                time = self._clock
+                record(time, self._process.value)
+
+                self._clock += self._config.delta_t
+
+                if stop_conditions and self._should_stop(time, self._process.value):
+                    break
+
+            self._steps_taken = step
+
+        if self._stop_reason is None:
+            self._stop_reason = "completed" if self._steps_taken == self._config.number_of_steps else "paused"
+
+    def _run_metrics_only(self, end: int) -> None:
+        delta_t = self._config.delta_t
+        stop_conditions = self._stop_conditions
+        step = self._steps_taken
+        for step in range(self._steps_taken + 1, end + 1):
+            output = self._controller.output(self._process.value, delta_t)
+            self._process.update(output, delta_t)
+
+            time = self._clock
+            self._metrics.update(time, self._process.value, delta_t)
+
+            self._clock += delta_t
+
+            if stop_conditions and self._should_stop(time, self._process.value):
+                break
+
+        self._steps_taken = step
+
+    def checkpoint(self, include_traces: bool = True) -> SimulationCheckpoint:
+        """
+        Snapshot of the run so far. Stop condition state is not included, restoring resets the conditions.
+
+        :param include_traces: also copy the recorded samples, so a restored run has the full trace
+        """
+        checkpoint = SimulationCheckpoint(self._clock, self._steps_taken, self._process.snapshot(),
+                                          self._controller.snapshot())
+        if include_traces and self._recorder is not None:
+            checkpoint.time_data = np.array(self._recorder.time_data)
+            checkpoint.process_data = np.array(self._recorder.process_data)
+        if self._metrics is not None:
+            checkpoint.metrics = copy.copy(self._metrics)
+        return checkpoint
+
+    def restore(self, checkpoint: SimulationCheckpoint) -> None:
+        """
+        Continues from checkpoint. Meant for a freshly built Simulation with the same config, the samples held by the
+        checkpoint are replayed into its recorder.
+        """
+        self._clock = checkpoint.clock
+        self._steps_taken = checkpoint.steps_taken
+        self._stop_reason = None
+        self._process.restore(checkpoint.process)
+        self._controller.restore(checkpoint.controller)
+
+        for condition in self._stop_conditions:
+            condition.reset()
+        if self._metrics is not None and checkpoint.metrics is not None:
+            self._metrics = copy.copy(checkpoint.metrics)
+        if self._recorder is not None and checkpoint.time_data is not None:
+            record = self._recorder.record
+            for time, value in zip(checkpoint.time_data.tolist(), checkpoint.process_data.tolist()):
+                record(time, value)
+
+    def fork(self) -> "Simulation":
+        """
+        Independent copy of the run at its current step, e.g. to continue several what-if branches (gains through
+        fork.controller.config, setpoints, disturbances through fork.process) from one shared prefix.
+        """
+        simulation = copy.copy(self)
+        simulation._process = self._process.fork()
+        simulation._controller = self._controller.fork()
+        simulation._stop_conditions = copy.deepcopy(self._stop_conditions)
+        simulation._recorder = copy.deepcopy(self._recorder)
+        simulation._metrics = copy.copy(self._metrics)
+        return simulation
+
+
+class BatchSimulation:
+    def __init__(self, config: SimulationConfig, processes: list[Process], pid_configs: list[PIDConfig],
+                 stop_conditions: list[StopCondition] = None, setpoint=None):
+        """
+        :param setpoint: optional setpoint trajectory overriding the configs' setpoints: a Schedule, an array of
+            number_of_steps setpoints shared by every row, or one row of them per process
+        """
+        if len(processes) != len(pid_configs):
+            raise ValueError("processes and pid_configs must have the same length")
+
+        self._config = config
+
+        self._process = type(processes[0]).batch(processes)
+
+        self._controller = PIDControllerBank(pid_configs)
+        self._stop_conditions = list(stop_conditions) if stop_conditions else []
+
+        self._setpoints = None
+        if setpoint is not None:
+            if isinstance(setpoint, Schedule):
+                setpoint = setpoint.values(np.arange(config.number_of_steps)*config.delta_t)
+            # one contiguous row of setpoints per step
+            self._setpoints = np.ascontiguousarray(
+                np.broadcast_to(np.asarray(setpoint, dtype=float), (len(processes), config.number_of_steps)).T)
+
+        self._clock = 0.0
+        self._steps_taken = np.full(len(processes), config.number_of_steps)
+        self._stop_reasons = ["completed"]*len(processes)
+
+        self._time_data = np.ndarray((len(processes), config.number_of_steps))
+        self._process_data = np.ndarray((len(processes), config.number_of_steps))
+
+    @property
+    def time_data(self) -> np.ndarray:
+        return self._time_data
+
+    @property
+    def process_data(self) -> np.ndarray:
+        return self._process_data
+
+    @property
+    def steps_taken(self) -> np.ndarray:
+        """
+        Step at which each row met a stop condition, number_of_steps for rows that never did. The arrays are trimmed
+        to the largest value, rows that stopped earlier keep being stepped until then.
+        """
+        return self._steps_taken
+
+    @property
+    def stop_reasons(self) -> list[str]:
+        return self._stop_reasons
+
+    def _check_stop(self, step: int, time: float, stopped: np.ndarray) -> np.ndarray:
+        for condition in self._stop_conditions:
+            triggered = condition.check_many(time, self._process.value, self._controller.setpoint,
+                                             self._config.delta_t) & ~stopped
+            for row in np.flatnonzero(triggered):
+                self._stop_reasons[row] = condition.reason
+                self._steps_taken[row] = step
+            stopped = stopped | triggered
+        return stopped
+
+    def run(self) -> None:
+        dt = self._config.delta_t
+        process = self._process
+        stop_conditions = self._stop_conditions
+        for condition in stop_conditions:
+            condition.reset(len(self._stop_reasons))
+        stopped = np.zeros(len(self._stop_reasons), dtype=bool)
+        setpoints = self._setpoints
+
+        for i in range(self._config.number_of_steps):
+            if setpoints is not None:
+                self._controller.setpoint = setpoints[i]
+            output = self._controller.output(process.value, dt)
+            process.update(output, dt)
+
+            self._time_data[:, i] = self._clock
+            self._process_data[:, i] = process.value
+
+            if stop_conditions:
+                stopped = self._check_stop(i + 1, self._clock, stopped)
+                if stopped.all():
+                    self._time_data = self._time_data[:, :i + 1]
+                    self._process_data = self._process_data[:, :i + 1]
+                    self._clock += dt
+                    break
+
+            self._clock += dt
+
+
+def _expm(matrix: np.ndarray) -> np.ndarray:
+    # scaling and squaring with a truncated Taylor series, plenty for the small closed loop matrices used here
+    norm = np.linalg.norm(matrix, ord=np.inf)
+    squarings = max(0, int(math.ceil(math.log2(norm))) + 1) if norm > 0.0 else 0
+    scaled = matrix/2.0**squarings
+
+    result = np.eye(matrix.shape[0])
+    term = np.eye(matrix.shape[0])
+    for k in range(1, 19):
+        term = term @ scaled/k
+        result = result + term
+
+    for _ in range(squarings):
+        result = result @ result
+
+    return result
+
+
+@functools.lru_cache(maxsize=256)
+def _transition_matrix(k_p: float, k_i: float, k_d: float, setpoint: float, lag_time: float, delta_t: float) -> np.ndarray:
+    # continuous closed loop with state [value, integral_error, 1]:
+    #   d(value)/dt = (k_p*(setpoint - value) + k_i*integral_error)/(lag_time + k_d)
+    #   d(integral_error)/dt = setpoint - value
+    gain = 1.0/(lag_time + k_d)
+    system = np.array([
+        [-k_p*gain, k_i*gain, k_p*setpoint*gain],
+        [-1.0, 0.0, setpoint],
+        [0.0, 0.0, 0.0],
+    ])
+    transition = _expm(system*delta_t)
+    transition.setflags(write=False)
+    return transition
+
+
+class ExactSimulation:
+    def __init__(self, config: SimulationConfig, process: Transmitter, controller: PIDController):
+        self._config = config
+        self._process = process
+        self._controller = controller
+
+        pid_config = controller.config
+        if pid_config.lower_bound < pid_config.upper_bound:
+            raise ValueError("ExactSimulation only models the unbounded loop, use Simulation for output bounds")
+        self._transition = _transition_matrix(
+            pid_config.k_p, pid_config.k_i, pid_config.k_d, pid_config.setpoint, process.lag_time, config.delta_t)
+
+        # the derivative term sees the step from the controller's previous error as an impulse, which moves the
+        # process instantly before the continuous response starts
+        error_step = pid_config.setpoint - process.value - controller.error
+        value = process.value + pid_config.k_d*error_step/(process.lag_time + pid_config.k_d)
+        self._initial_state = np.array([value, controller.integral_error, 1.0])
 
         self._time_data = np.ndarray(config.number_of_steps)
         self._process_data = np.ndarray(config.number_of_steps)
@@ -29,17 +387,140 @@ class Simulation:
     @property
     def time_data(self) -> np.ndarray:
         return self._time_data
-    
+
     @property
     def process_data(self) -> np.ndarray:
         return self._process_data
-    
+
+    def state_at(self, step: int) -> np.ndarray:
+        return np.linalg.matrix_power(self._transition, step) @ self._initial_state
+
     def run(self) -> None:
-        for i in range(self._config.number_of_steps):
-            output = self._controller.output(self._process.value, self._config.delta_t)
-            self._process.update(output, self._config.delta_t)
+        number_of_steps = self._config.number_of_steps
+        if number_of_steps == 0:
+            return
+
+        # blocked powers: powers[j] = A^(j+1) for one block of steps and starts[m] = A^(m*block) x0, so every state is
+        # powers[j] @ starts[m], which takes about 2*sqrt(n) small products instead of n
+        block = max(math.isqrt(number_of_steps), 1)
+        powers = np.empty((block, 3, 3))
+        powers[0] = self._transition
+        for j in range(1, block):
+            powers[j] = self._transition @ powers[j - 1]
+
+        number_of_blocks = math.ceil(number_of_steps/block)
+        starts = np.empty((number_of_blocks, 3))
+        starts[0] = self._initial_state
+        for m in range(1, number_of_blocks):
+            starts[m] = powers[-1] @ starts[m - 1]
+
+        # only the process value row of each power is needed for the trace
+        self._process_data[:] = (starts @ powers[:, 0, :].T).ravel()[:number_of_steps]
+        state = powers[(number_of_steps - 1) % block] @ starts[(number_of_steps - 1)//block]
+
+        self._time_data[:] = np.arange(self._config.number_of_steps)*self._config.delta_t
+
+        self._process.value = state[0]
+        self._controller.error = self._controller.config.setpoint - state[0]
+        self._controller.integral_error = state[1]
+
+
+class AdaptiveSimulation:
+    def __init__(self, config: SimulationConfig, process: Transmitter, controller: PIDController,
+                 rtol: float = 1e-6, atol: float = 1e-8, max_step: float = None):
+        """
+        Adaptive step integration (Bogacki-Shampine RK2(3)) of the same continuous closed loop as ExactSimulation.
+        config.delta_t is only the first trial step, steps then grow or shrink so the embedded error estimate stays
+        within rtol/atol, so settled stretches are crossed in a few large steps. Samples are at non-uniform times,
+        use resample for a uniform grid.
+        """
+        self._config = config
+        self._process = process
+        self._controller = controller
+        self._rtol = rtol
+        self._atol = atol
+        self._max_step = max_step if max_step is not None else config.run_time
+
+        pid_config = controller.config
+        if pid_config.lower_bound < pid_config.upper_bound:
+            raise ValueError("AdaptiveSimulation only models the unbounded loop, use Simulation for output bounds")
+        self._gain = 1.0/(process.lag_time + pid_config.k_d)
+        self._k_p = pid_config.k_p
+        self._k_i = pid_config.k_i
+        self._setpoint = pid_config.setpoint
+
+        # same impulse from the derivative term as in ExactSimulation
+        error_step = pid_config.setpoint - process.value - controller.error
+        self._initial_value = process.value + pid_config.k_d*error_step/(process.lag_time + pid_config.k_d)
+
+        self._time_data = None
+        self._process_data = None
+        self.rejected_steps = 0
+
+    @property
+    def time_data(self) -> np.ndarray:
+        return self._time_data
+
+    @property
+    def process_data(self) -> np.ndarray:
+        return self._process_data
+
+    def _derivative(self, value: float, integral_error: float) -> tuple[float, float]:
+        error = self._setpoint - value
+        return (self._k_p*error + self._k_i*integral_error)*self._gain, error
+
+    def run(self) -> None:
+        rtol, atol = self._rtol, self._atol
+        end = self._config.run_time
+
+        clock = 0.0
+        value = self._initial_value
+        integral_error = self._controller.integral_error
+        step = min(self._config.delta_t, self._max_step)
+        k1 = self._derivative(value, integral_error)
+
+        times = [clock]
+        values = [value]
+        while clock < end:
+            step = min(step, end - clock)
+
+            k2 = self._derivative(value + 0.5*step*k1[0], integral_error + 0.5*step*k1[1])
+            k3 = self._derivative(value + 0.75*step*k2[0], integral_error + 0.75*step*k2[1])
+            new_value = value + step*(2/9*k1[0] + 1/3*k2[0] + 4/9*k3[0])
+            new_integral_error = integral_error + step*(2/9*k1[1] + 1/3*k2[1] + 4/9*k3[1])
+            k4 = self._derivative(new_value, new_integral_error)
+
+            value_error = step*(-5/72*k1[0] + 1/12*k2[0] + 1/9*k3[0] - 1/8*k4[0])
+            integral_error_error = step*(-5/72*k1[1] + 1/12*k2[1] + 1/9*k3[1] - 1/8*k4[1])
+            value_scale = atol + rtol*max(abs(value), abs(new_value))
+            integral_error_scale = atol + rtol*max(abs(integral_error), abs(new_integral_error))
+            error_norm = math.sqrt(0.5*((value_error/value_scale)**2 + (integral_error_error/integral_error_scale)**2))
+
+            if error_norm <= 1.0:
+                clock += step
+                value = new_value
+                integral_error = new_integral_error
+                k1 = k4
+                times.append(clock)
+                values.append(value)
+            else:
+                self.rejected_steps += 1
+
+            factor = 5.0 if error_norm == 0.0 else min(5.0, max(0.2, 0.9*error_norm**(-1/3)))
+            step = min(step*factor, self._max_step)
+
+        self._time_data = np.array(times)
+        self._process_data = np.array(values)
 
-            self._time_data[i] = self._clock
-            self._process_data[i] = self._process.value
+        self._process.value = value
+        self._controller.error = self._setpoint - value
+        self._controller.integral_error = integral_error
 
-            self._clock += self._config.delta_t
+    def resample(self, delta_t: float = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Linearly interpolates the run onto a uniform grid, config.delta_t by default.
+        """
+        delta_t = delta_t if delta_t is not None else self._config.delta_t
+        time_data = np.arange(math.ceil(self._config.run_time/delta_t) + 1)*delta_t
+        time_data = time_data[time_data <= self._config.run_time]
+        return time_data, np.interp(time_data, self._time_data, self._process_data)
@@ -0,0 +1,95 @@
+import abc
+import math
+import numpy as np
+
+
+class StopCondition(abc.ABC):
+    """
+    Ends a simulation run early. check is called after every step of a Simulation, check_many after every step of a
+    BatchSimulation with one row per run. reset is called when a run starts.
+    """
+
+    reason = "stopped"
+
+    def reset(self, size: int = None) -> None:
+        pass
+
+    @abc.abstractmethod
+    def check(self, time: float, value: float, setpoint: float, delta_t: float) -> bool: ...
+
+    @abc.abstractmethod
+    def check_many(self, time: float, values: np.ndarray, setpoints: np.ndarray, delta_t: float) -> np.ndarray: ...
+
+
+class Settled(StopCondition):
+    reason = "settled"
+
+    def __init__(self, band: float = 0.02, duration: float = 10.0, tolerance: float = None):
+        """
+        Stops once the process has stayed within +-band (a fraction of the setpoint) of the setpoint for duration
+        seconds.
+
+        :param band: allowed deviation as a fraction of the setpoint
+        :param duration: seconds the process has to stay in the band
+        :param tolerance: absolute allowed deviation, overrides band
+        """
+        self.band = band
+        self.duration = duration
+        self.tolerance = tolerance
+        self._time_in_band = 0.0
+
+    def reset(self, size: int = None) -> None:
+        self._time_in_band = 0.0 if size is None else np.zeros(size)
+
+    def _width(self, setpoint):
+        return self.tolerance if self.tolerance is not None else self.band*abs(setpoint)
+
+    def check(self, time: float, value: float, setpoint: float, delta_t: float) -> bool:
+        if abs(setpoint - value) <= self._width(setpoint):
+            self._time_in_band += delta_t
+        else:
+            self._time_in_band = 0.0
+        return self._time_in_band >= self.duration - 0.5*delta_t
+
+    def check_many(self, time: float, values: np.ndarray, setpoints: np.ndarray, delta_t: float) -> np.ndarray:
+        in_band = np.abs(setpoints - values) <= self._width(setpoints)
+        self._time_in_band = np.where(in_band, self._time_in_band + delta_t, 0.0)
+        return self._time_in_band >= self.duration - 0.5*delta_t
+
+
+class Diverged(StopCondition):
+    reason = "diverged"
+
+    def __init__(self, bound: float):
+        """
+        Stops once the process is further than bound from the setpoint, or is no longer finite.
+
+        :param bound: absolute distance from the setpoint
+        """
+        self.bound = bound
+
+    def check(self, time: float, value: float, setpoint: float, delta_t: float) -> bool:
+        return not math.isfinite(value) or abs(value - setpoint) > self.bound
+
+    def check_many(self, time: float, values: np.ndarray, setpoints: np.ndarray, delta_t: float) -> np.ndarray:
+        with np.errstate(invalid="ignore"):
+            return ~np.isfinite(values) | (np.abs(values - setpoints) > self.bound)
+
+
+class Predicate(StopCondition):
+    def __init__(self, predicate, reason: str = "predicate"):
+        """
+        Stops when predicate(time, value, setpoint) is true. For BatchSimulation the predicate receives arrays and
+        has to return a boolean array.
+
+        :param predicate: callable(time, value, setpoint) -> bool
+        :param reason: stop reason reported when the predicate fires
+        """
+        self.predicate = predicate
+        self.reason = reason
+
+    def check(self, time: float, value: float, setpoint: float, delta_t: float) -> bool:
+        return bool(self.predicate(time, value, setpoint))
+
+    def check_many(self, time: float, values: np.ndarray, setpoints: np.ndarray, delta_t: float) -> np.ndarray:
+        return np.asarray(self.predicate(time, values, setpoints), dtype=bool)
@@ -0,0 +1,129 @@
+import concurrent.futures
+import copy
+import dataclasses
+import numpy as np
+
+from Metrics import compute_metrics
+from PID import PIDConfig
+from Simulation import BatchSimulation, Process, SimulationConfig
+from StopConditions import Diverged, StopCondition
+
+
+@dataclasses.dataclass
+class TuningScore:
+    k_p: float
+    k_i: float
+    k_d: float
+    ise: float
+    iae: float
+    overshoot: float
+    rise_time: float
+    settling_time: float
+
+
+def grid_gains(k_p_values, k_i_values, k_d_values) -> np.ndarray:
+    """
+    Every combination of the given gains as an (M, 3) array of k_p, k_i, k_d rows.
+    """
+    grid = np.meshgrid(k_p_values, k_i_values, k_d_values, indexing="ij")
+    return np.stack([axis.ravel() for axis in grid], axis=-1).astype(float)
+
+
+def random_gains(count: int, k_p_range: tuple[float, float], k_i_range: tuple[float, float],
+                 k_d_range: tuple[float, float], seed=None) -> np.ndarray:
+    """
+    count uniformly sampled gain sets as an (count, 3) array of k_p, k_i, k_d rows.
+    """
+    rng = np.random.default_rng(seed)
+    low, high = np.array([k_p_range, k_i_range, k_d_range], dtype=float).T
+    return rng.uniform(low, high, size=(count, 3))
+
+
+def score_gains(simulation_config: SimulationConfig, process: Process, setpoint: float, gains: np.ndarray,
+                settling_band: float = 0.02, stop_conditions: list[StopCondition] = None) -> dict[str, np.ndarray]:
+    """
+    Runs every row of gains in one BatchSimulation and returns compute_metrics' step response metrics, one value per
+    row. Runs stopped by Diverged get inf for every metric.
+
+    :param simulation_config: run time and step size used for every run
+    :param process: initial plant state, copied for every run
+    :param setpoint: setpoint used for every run
+    :param gains: (M, 3) array of k_p, k_i, k_d rows
+    :param settling_band: fraction of the step size used for the settling time
+    :param stop_conditions: passed to BatchSimulation
+    """
+    pid_configs = [PIDConfig(k_p=k_p, k_i=k_i, k_d=k_d, setpoint=setpoint) for k_p, k_i, k_d in gains]
+    processes = [copy.deepcopy(process) for _ in pid_configs]
+
+    with np.errstate(over="ignore", invalid="ignore"):
+        simulation = BatchSimulation(simulation_config, processes, pid_configs, stop_conditions)
+        simulation.run()
+        metrics = compute_metrics(simulation.time_data, simulation.process_data,
+                                  np.full(len(gains), setpoint), np.full(len(gains), process.value), settling_band,
+                                  simulation.steps_taken)
+
+    # every row is scored up to its own stop, not up to where the last row of the batch stopped, so scores don't
+    # depend on which batch a gain set lands in
+    diverged = np.array([reason == Diverged.reason for reason in simulation.stop_reasons], dtype=bool)
+    # a diverged run stopped early has small partial scores, rank it with the unstable runs instead
+    return {name: np.where(diverged, np.inf, values) for name, values in metrics.items()}
+
+
+def _score_chunk(simulation_config: SimulationConfig, process: Process, setpoint: float,
+                 settling_band: float, stop_conditions: list[StopCondition], gains: np.ndarray) -> np.ndarray:
+    metrics = score_gains(simulation_config, process, setpoint, gains, settling_band, stop_conditions)
+    return np.column_stack([metrics[name] for name in ("ise", "iae", "overshoot", "rise_time", "settling_time")])
+
+
+class GainSweep:
+    def __init__(self, simulation_config: SimulationConfig, process: Process, setpoint: float,
+                 max_workers=None, chunk_size: int = 64, settling_band: float = 0.02,
+                 stop_conditions: list[StopCondition] = None):
+        """
+        Scores many PID gain sets against the same plant, spreading batches of runs across a process pool. Only the
+        scores are sent back from the workers, the traces are dropped as soon as each batch is scored.
+
+        :param simulation_config: run time and step size used for every run
+        :param process: initial plant state (Transmitter or TankPlant), copied for every run
+        :param setpoint: setpoint used for every run
+        :param max_workers: process pool size, None for all cores and 1 to score in this process
+        :param chunk_size: number of gain sets stepped together in one BatchSimulation
+        :param settling_band: fraction of the step size used for the settling time
+        :param stop_conditions: lets each batch stop once all its runs have e.g. settled or diverged, diverged runs
+            get infinite scores
+        """
+        self._simulation_config = simulation_config
+        self._process = process
+        self._setpoint = setpoint
+        self._max_workers = max_workers
+        self._chunk_size = chunk_size
+        self._settling_band = settling_band
+        self._stop_conditions = stop_conditions
+
+    def run(self, gains: np.ndarray, rank_by: str = "ise") -> list[TuningScore]:
+        """
+        Scores every row of gains and returns the results ranked best first. Unstable runs (NaN/inf scores) sink to
+        the bottom.
+
+        :param gains: (M, 3) array of k_p, k_i, k_d rows, see grid_gains and random_gains
+        :param rank_by: TuningScore field to rank on, lower is better
+        """
+        gains = np.asarray(gains, dtype=float).reshape(-1, 3)
+        chunks = [gains[i:i + self._chunk_size] for i in range(0, len(gains), self._chunk_size)]
+        arguments = (self._simulation_config, self._process, self._setpoint, self._settling_band,
+                     self._stop_conditions)
+
+        if self._max_workers == 1:
+            results = [_score_chunk(*arguments, chunk) for chunk in chunks]
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=self._max_workers) as executor:
+                futures = [executor.submit(_score_chunk, *arguments, chunk) for chunk in chunks]
+                results = [future.result() for future in futures]
+
+        scores = [
+            TuningScore(*gain_set, *row)
+            for gain_set, row in zip(gains.tolist(), np.concatenate(results).tolist() if results else [])
+        ]
+        scores.sort(key=lambda entry: (not np.isfinite(getattr(entry, rank_by)), getattr(entry, rank_by)))
+
+        return scores
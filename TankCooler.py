@@ -1,6 +1,6 @@
 import numpy
 import numpy as np
-from utils import dprinter
+import utils
 
 class Cooler:
     def __init__(self):
@@ -16,8 +16,8 @@ class Cooler:
         self.min_cool = 3/60
         self.param_range = [0, 1]
         self.debug = False
-        self.dprinter = dprinter(debug=self.debug)
-        self.print = self.dprinter.print
+        self.logger = utils.Logger()
+        self._stage_cache = None
 
     def toggle_debug(self):
         """
@@ -25,7 +25,38 @@ class Cooler:
         """
 
         self.debug = not self.debug
-        self.dprinter.debug = self.debug
+        self.logger.level = utils.DEBUG if self.debug else utils.INFO
+
+    def snapshot(self) -> dict:
+        """
+        Returns the cooler state as plain values, see restore.
+        """
+
+        return {"cooler_param": self.cooler_param, "max_cool": self.max_cool, "min_cool": self.min_cool,
+                "param_range": list(self.param_range)}
+
+    def restore(self, state):
+        """
+        Sets the cooler to a state returned by snapshot.
+
+        :param state: dict from snapshot
+        """
+
+        self.cooler_param = state["cooler_param"]
+        self.max_cool = state["max_cool"]
+        self.min_cool = state["min_cool"]
+        self.param_range = list(state["param_range"])
+
+    def fork(self):
+        """
+        Returns an independent cooler in the same state, logging at the same level.
+        """
+
+        cooler = Cooler()
+        cooler.restore(self.snapshot())
+        cooler.debug = self.debug
+        cooler.logger.level = self.logger.level
+        return cooler
 
     def set_cooler_param(self, val):
         """
@@ -35,7 +66,25 @@ class Cooler:
         """
 
         self.cooler_param = val
-        self.print(msg=f"Setting cooler param: {val}")
+        self.logger.debug("Setting cooler param: %s", val)
+
+    def stage_table(self):
+        """
+        Returns the stage thresholds and cooling rates, rebuilding them only when min_cool, max_cool or param_range
+        have changed since the last call.
+
+        :return: (key, thresholds, rates) where thresholds are the lower edges of stages 3-5 and rates hold all 5 stages
+        """
+
+        key = (self.min_cool, self.max_cool, self.param_range[0], self.param_range[1])
+        if self._stage_cache is None or self._stage_cache[0] != key:
+            cooling_steps = np.linspace(self.min_cool, self.max_cool, 5)
+            thresholds = (self.param_range[1]/3, 2*self.param_range[1]/3, self.param_range[1])
+            rates = (-1 * float(cooling_steps[0]), -1 * float(cooling_steps[1]), -1 * float(cooling_steps[2]),
+                     -1 * float(cooling_steps[3]), -1 * self.max_cool)
+            self._stage_cache = (key, thresholds, rates)
+
+        return self._stage_cache
 
     def cooling_function(self, method="step") -> float:
         """
@@ -50,30 +99,45 @@ class Cooler:
         """
 
         if method == "step":
-            cooling_steps = np.linspace(self.min_cool, self.max_cool, 5)
+            _, thresholds, rates = self.stage_table()
             if self.cooler_param <= self.param_range[0]:
-                self.print(f"Running cooler at State 1 minimum rate: {-1*cooling_steps[0]}")
+                stage = 0
                 self.cooler_param = self.param_range[0]
-                return -1 * cooling_steps[0]
-            elif self.cooler_param < self.param_range[1]/3:
-                cool_rate = -1 * (cooling_steps[1])
-                self.print(f"Running cooler at Stage 2 rate: {cool_rate}")
-                return cool_rate
-            elif self.cooler_param < 2*self.param_range[1]/3:
-                cool_rate = -1 * cooling_steps[2]
-                self.print(f"Running cooler at Stage 3 rate: {cool_rate}")
-                return cool_rate
-            elif self.cooler_param < self.param_range[1]:
-                cool_rate = -1 * cooling_steps[3]
-                self.print(f"Running cooler at Stage 4 rate: {cool_rate}")
-                return cool_rate
+            elif self.cooler_param < thresholds[0]:
+                stage = 1
+            elif self.cooler_param < thresholds[1]:
+                stage = 2
+            elif self.cooler_param < thresholds[2]:
+                stage = 3
             else:
-                self.print(f"Running cooler at Stage 5 maximum rate{-1*self.max_cool}")
+                stage = 4
                 self.cooler_param = self.param_range[1]
-                return -1 * self.max_cool
+
+            self.logger.debug("Running cooler at Stage %d rate: %s", stage + 1, rates[stage])
+            return rates[stage]
         else:
             return -5*self.cooler_param
 
+    def cooling_rates(self, cooler_params, method="step") -> np.ndarray:
+        """
+
+        Vectorised cooling_function, evaluates many cooler params in one call. Unlike cooling_function this does not
+        clamp or store cooler_param.
+
+        :param cooler_params: array of cooler params
+        :param method: method selector for the cooling function, either step or other (linear f(x))
+        :return: array of cooling rates (C/s) matching cooler_params
+        """
+
+        cooler_params = np.asarray(cooler_params, dtype=float)
+        if method == "step":
+            _, thresholds, rates = self.stage_table()
+            stages = np.searchsorted(thresholds, cooler_params, side="right") + 1
+            stages = np.where(cooler_params <= self.param_range[0], 0, stages)
+            return np.asarray(rates)[stages]
+        else:
+            return -5*cooler_params
+
     def get_cooling_rate(self) -> float:
         """
         :return: Cooling rate (C/s) for current parameters
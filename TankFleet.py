@@ -0,0 +1,143 @@
+import asyncio
+
+import Clock
+from PID import PIDController
+from Setpoints import Schedule
+from TankCooler import Cooler
+from TankMonitor import CanOfSoda, LiveReading
+
+
+class TankLoop:
+    def __init__(self, can: CanOfSoda, cooler: Cooler, controller: PIDController, cooler_param: float = 0.0,
+                 param_step: float = 0.1, target=None):
+        """
+
+        One tank/cooler/controller triple of a live fleet, the control side of LiveSystem without the plotting.
+
+        :param can: tank being monitored
+        :param cooler: cooler connected to the tank
+        :param controller: controller acting on the tank temperature
+        :param cooler_param: initial cooler param
+        :param param_step: change of cooler param per control step, the sign of the control output picks the direction
+        :param target: optional callable taking a LiveReading and returning the setpoint, or a Setpoints.Schedule
+            evaluated at the reading's time of day. The controller's setpoint is left alone when None
+        """
+
+        if isinstance(target, Schedule):
+            schedule = target
+            target = lambda reading: schedule.at(Clock.seconds_of_day(reading.time))
+
+        self.can = can
+        self.cooler = cooler
+        self.controller = controller
+        self.cooler_param = cooler_param
+        self.param_step = param_step
+        self.target = target
+        self.last_reading = None
+
+        cooler.set_cooler_param(cooler_param)
+        can.set_external_heat(cooler.get_cooling_rate())
+
+    def control(self, reading: LiveReading, dt: float):
+        """
+
+        Applies one control correction for a reading.
+
+        :param reading: latest reading of the tank
+        :param dt: time since the previous reading
+        """
+
+        if self.target is not None:
+            self.controller.setpoint = self.target(reading)
+
+        control = self.controller.output(reading.temperature, dt)
+
+        low, high = self.cooler.param_range
+        if control > 0:
+            self.cooler_param = max(self.cooler_param - self.param_step, low)
+        else:
+            self.cooler_param = min(self.cooler_param + self.param_step, high)
+
+        self.cooler.set_cooler_param(self.cooler_param)
+        self.can.set_external_heat(self.cooler.get_cooling_rate())
+        self.last_reading = reading
+
+
+async def control_loop(tank_loop: TankLoop, readings: asyncio.Queue):
+    """
+
+    asyncio version of the LiveSystem control loop, wakes on every reading published by CanOfSoda.run_async.
+
+    :param tank_loop: triple to control
+    :param readings: queue the tank publishes to
+    """
+
+    while True:
+        reading = await readings.get()
+        tank_loop.control(reading, tank_loop.can.report_interval)
+        readings.task_done()
+
+
+class TankFleet:
+    def __init__(self, dt: float = 1.0, clock=None):
+        """
+
+        Runs many TankLoops on one event loop. A single coroutine ticks every tank each dt against fixed deadlines on
+        clock, so there is no per tank thread or task and timing does not drift. Each tank publishes a reading every
+        can.report_interval seconds of fleet time, which is handed straight to its control step.
+
+        :param dt: tick period in seconds, also used as the tank time step
+        :param clock: Clock driving the fleet and its tanks, defaults to real time. A ScaledClock or SteppedClock
+            replays the fleet faster than real time.
+        """
+
+        self.dt = dt
+        self.clock = clock if clock is not None else Clock.RealClock()
+        self.tank_loops = []
+        self.ticks = 0
+        self.late_ticks = 0
+
+    def add(self, tank_loop: TankLoop) -> TankLoop:
+        tank_loop.can.dt = self.dt
+        tank_loop.can.clock = self.clock
+        tank_loop.cooler.logger.clock = self.clock
+        self.tank_loops.append(tank_loop)
+        return tank_loop
+
+    def tick(self) -> None:
+        """
+
+        Advances every tank by dt and runs the control step of those due to report. Readings are stamped with the
+        tank clock's datetime, like CanOfSoda.run does.
+
+        """
+
+        for tank_loop in self.tank_loops:
+            can = tank_loop.can
+            can.update_temperature()
+
+            interval = can.report_interval
+            if self.ticks % max(round(interval / self.dt), 1) == 0:
+                tank_loop.control(LiveReading(temperature=can.temperature, time=can.clock.now(),
+                                              critical_temperature=can.critical_temperature), interval)
+
+        self.ticks += 1
+
+    async def run(self, duration=None):
+        """
+
+        Ticks the fleet until cancelled, or for duration seconds.
+
+        :param duration: optional run length in seconds
+        """
+
+        start = self.clock.time()
+        start_tick = self.ticks
+        while duration is None or (self.ticks - start_tick) * self.dt < duration:
+            self.tick()
+
+            deadline = start + (self.ticks - start_tick) * self.dt
+            delay = deadline - self.clock.time()
+            if delay < 0:
+                self.late_ticks += 1
+            await self.clock.sleep_async(max(delay, 0))
@@ -1,17 +1,106 @@
-from utils import dprinter
+import Clock
+import utils
+import asyncio
+import collections
+import dataclasses
+import threading
 import time
 import numpy as np
 from datetime import datetime
 
+REPORT_INTERVAL = 5  # s, default time between two published readings
+
+
+@dataclasses.dataclass
+class LiveReading:
+    temperature: float  # C
+    time: datetime
+    critical_temperature: float  # C
+    published_ns: int = 0  # time.perf_counter_ns() when the reading was published, for sample age measurements
+
+
+class ReadingChannel:
+    def __init__(self, maxsize=16):
+        """
+
+        Bounded, thread-safe handoff of LiveReadings from the tank to its consumers. get() blocks until a reading is
+        available and wakes as soon as one is put. When the channel is full the oldest reading is dropped, so the
+        producing tank never blocks.
+
+        :param maxsize: maximum number of readings held
+        """
+
+        self._readings = collections.deque(maxlen=maxsize)
+        self._condition = threading.Condition()
+        self._unfinished = 0
+        self.dropped = 0
+
+    def put(self, reading: LiveReading):
+        with self._condition:
+            if len(self._readings) == self._readings.maxlen:
+                self.dropped += 1
+                self._unfinished -= 1
+            self._readings.append(reading)
+            self._unfinished += 1
+            self._condition.notify_all()
+
+    def get(self, block=True, timeout=None):
+        """
+
+        :param block: wait for a reading if none is available
+        :param timeout: maximum wait in seconds, None waits forever
+        :return: the oldest LiveReading, or None if none arrived in time
+        """
+
+        with self._condition:
+            if block and not self._readings:
+                self._condition.wait_for(lambda: self._readings, timeout=timeout)
+            if not self._readings:
+                return None
+            return self._readings.popleft()
+
+    def task_done(self):
+        """
+        Marks a reading taken with get as fully processed, see join.
+        """
+
+        with self._condition:
+            self._unfinished -= 1
+            self._condition.notify_all()
+
+    def join(self):
+        """
+        Blocks until every reading put so far has been taken and marked with task_done.
+        """
+
+        with self._condition:
+            self._condition.wait_for(lambda: self._unfinished <= 0)
+
+    def __len__(self):
+        return len(self._readings)
+
+    def __getstate__(self):
+        # the condition can't be pickled, copies (e.g. a tank sent to a sweep worker) start with an empty channel
+        return {"maxsize": self._readings.maxlen}
+
+    def __setstate__(self, state):
+        self.__init__(maxsize=state["maxsize"])
+
 
 class CanOfSoda:
-    def __init__(self):
+    __slots__ = ("temperature", "internal_heater", "external_heat_exchange", "critical_temperature",
+                 "critical_trigger", "_temperature_history", "internal_time", "dt", "debug", "logger",
+                 "warning_interval", "include_disturbance", "readings", "report_interval", "_clock")
+
+    def __init__(self, history_limit=None):
         """
 
         Simulates a particularly special can of soda that has it's own heating element.
 
         Monitors the temperature of the can, and handles the temperature increase due to internal and external sources.
 
+        :param history_limit: if set, only the most recent history_limit temperatures are kept in temperature_history
+
         """
 
         self.temperature = 23  # C
@@ -19,16 +108,27 @@ class CanOfSoda:
         self.external_heat_exchange = 5 / 60  # C/s
         self.critical_temperature = 49  # C
         self.critical_trigger = False
-        self.temperature_history = []
+        self._temperature_history = utils.FloatHistory(limit=history_limit)
         self.internal_time = 0
         self.dt = 1
         self.debug = False
-        self.dprinter = dprinter(debug=self.debug)
-        self.print = self.dprinter.print
+        self.logger = utils.Logger()
+        self.warning_interval = 60  # s, minimum clock time between repeated critical temperature warnings
         self.include_disturbance = True
 
-        self.shelf = []
-        self.report_interval = 5
+        self.readings = ReadingChannel()
+        self.report_interval = REPORT_INTERVAL
+        self.clock = Clock.RealClock()
+
+    @property
+    def clock(self):
+        return self._clock
+
+    @clock.setter
+    def clock(self, clock):
+        # the logger rate limits the critical temperature warning on the same clock as the tank
+        self._clock = clock
+        self.logger.clock = clock
 
     # region helpers
     def toggle_debug(self):
@@ -37,7 +137,7 @@ class CanOfSoda:
         """
 
         self.debug = not self.debug
-        self.dprinter.debug = self.debug
+        self.logger.level = utils.DEBUG if self.debug else utils.INFO
 
     @staticmethod
     def celcius_to_kelvin(val) -> float:
@@ -68,11 +168,8 @@ class CanOfSoda:
         Updates the system temperature using all system parameters and logic.
 
         """
-        self.print(
-            f"Updating Temperatures by summing "
-            f"T: {self.temperature} "
-            f"Hi: {self.internal_heater} "
-            f"Ho {self.external_heat_exchange}")
+        self.logger.debug("Updating Temperatures by summing T: %s Hi: %s Ho %s",
+                          self.temperature, self.internal_heater, self.external_heat_exchange)
 
         operational_heater = self.internal_heater
 
@@ -83,7 +180,7 @@ class CanOfSoda:
 
         self.temperature = self.temperature + operational_heater * self.dt + self.external_heat_exchange * self.dt
         self.check_temp_conditions()
-        self.temperature_history.append(self.temperature)
+        self._temperature_history.append(self.temperature)
 
     def check_temp_conditions(self):
         """
@@ -95,20 +192,44 @@ class CanOfSoda:
         """
         if self.temperature > self.critical_temperature * 0.75:
             self.critical_trigger = True
-            print(f"{datetime.now()} :: "
-                  f"WARNING: SODA TEMPERATURE {self.temperature:0.2f}C, "
-                  f"MAX ALLOWED TEMPERATURE OF {self.critical_temperature}C")
+            self.logger.warning("SODA TEMPERATURE %0.2fC, MAX ALLOWED TEMPERATURE OF %sC",
+                                self.temperature, self.critical_temperature,
+                                key="critical temperature", interval=self.warning_interval)
         else:
             if self.critical_trigger:
-                print(f"{datetime.now()} :: "
-                      f"Info: Critical temperature warning ended, temperature in safe zone."
-                      f" T<{self.critical_temperature * 0.75}C")
+                self.logger.info("Critical temperature warning ended, temperature in safe zone. T<%sC",
+                                 self.critical_temperature * 0.75)
+                self.logger.reset("critical temperature")
                 self.critical_trigger = False
 
     # endregion
 
     # region setters/getters
 
+    @property
+    def temperature_history(self) -> np.ndarray:
+        """
+
+        Recorded temperatures, oldest first, as a read-only array over the history buffer (no copy is made).
+
+        """
+
+        return self._temperature_history.view()
+
+    @temperature_history.setter
+    def temperature_history(self, values):
+        self._temperature_history = utils.FloatHistory(values, limit=self._temperature_history.limit)
+
+    def extend_temperature_history(self, values):
+        """
+
+        Appends temperatures produced outside update_temperature, e.g. by a fused simulation loop.
+
+        :param values: array of temperatures, C
+        """
+
+        self._temperature_history.extend(values)
+
     def set_external_heat(self, val):
         """
 
@@ -143,70 +264,154 @@ class CanOfSoda:
 
     # endregion
 
-    # region concurrent running
+    # region state
 
-    def GetLiveReading(self) -> dict:
+    def snapshot(self) -> dict:
         """
 
-        Checks if there a value has been produced and returns it, then clears the holder. If no value is present a dict
-        with all values set to np.NaN is returned instead.
+        Returns the simulated state of the tank as plain values (floats and the temperature history as an array), so it
+        can be pickled or saved and restored later. The readings channel, logger and clock are not included.
 
-        :return: dict
         """
 
-        if len(self.shelf) > 0:
-            ret_val = self.shelf[0]
-            self.shelf = []
-            return ret_val
-        else:
-            # This is dirty, runs the risk of updating the LiveReading later with more values and needing to update it
-            # here would want to create a base_dict that gets cleared and returned that can be quickly set to all np.NaN
-            # for readings.
-            ret_val = {
-                "temperature": np.NaN,
-                "time": np.NaN,
-                "critical temp": np.NaN
-            }
+        return {
+            "temperature": self.temperature,
+            "internal_heater": self.internal_heater,
+            "external_heat_exchange": self.external_heat_exchange,
+            "critical_temperature": self.critical_temperature,
+            "critical_trigger": self.critical_trigger,
+            "internal_time": self.internal_time,
+            "dt": self.dt,
+            "include_disturbance": self.include_disturbance,
+            "history_limit": self._temperature_history.limit,
+            "temperature_history": np.array(self._temperature_history),
+        }
 
-            return ret_val
+    def restore(self, state):
+        """
 
-    def SetLiveReading(self, value, time_obj):
+        Sets the tank to a state returned by snapshot.
+
+        :param state: dict from snapshot
         """
 
-        Sets gives the values to the handler to make available to external software.
+        self.temperature = state["temperature"]
+        self.internal_heater = state["internal_heater"]
+        self.external_heat_exchange = state["external_heat_exchange"]
+        self.critical_temperature = state["critical_temperature"]
+        self.critical_trigger = state["critical_trigger"]
+        self.internal_time = state["internal_time"]
+        self.dt = state["dt"]
+        self.include_disturbance = state["include_disturbance"]
+        self._temperature_history = utils.FloatHistory(limit=state["history_limit"])
+        self._temperature_history.extend(state["temperature_history"])
+
+    def fork(self):
+        """
+
+        Returns an independent tank in the same state, sharing the clock and logging at the same level, with an empty
+        readings channel. Use it to continue several what-if branches from one point of a run.
 
-        :param value: Temperature value to place in the LiveReading results dictionary.
-        :param time_obj: Time object used by the Tank to be placed into the LiveReading results dictionary
         """
 
-        self.print(f"updating with {value}")
+        can = CanOfSoda()
+        can.restore(self.snapshot())
+        can.debug = self.debug
+        can.logger.level = self.logger.level
+        can.warning_interval = self.warning_interval
+        can.report_interval = self.report_interval
+        can.clock = self.clock
+        return can
 
-        ret_val = {
-            "temperature": value,
-            "time": time_obj,
-            "critical temp": self.critical_temperature
-        }
+    # endregion
+
+    # region concurrent running
+
+    def GetLiveReading(self, block=True, timeout=None):
+        """
+
+        Takes the oldest reading produced by the tank, waiting for one to arrive if necessary.
+
+        :param block: wait for a reading if none is available
+        :param timeout: maximum wait in seconds, None waits forever
+        :return: LiveReading, or None if no reading arrived in time
+        """
+
+        return self.readings.get(block=block, timeout=timeout)
+
+    def SetLiveReading(self, value, time_obj):
+        """
 
-        self.shelf.append(ret_val)
+        Publishes a reading to the channel to make available to external software.
 
-    def run(self):
+        :param value: Temperature value to place in the LiveReading.
+        :param time_obj: Time object used by the Tank to be placed into the LiveReading
         """
 
-        Begins the tank operation loop.
+        self.logger.debug("updating with %s", value)
 
+        self.readings.put(LiveReading(temperature=value, time=time_obj, critical_temperature=self.critical_temperature,
+                                      published_ns=time.perf_counter_ns()))
+
+    def run(self, stop=None):
+        """
+
+        Begins the tank operation loop. A reading is published every report_interval seconds. Time is taken from
+        self.clock, with a lockstep clock the loop waits for every reading to be processed before moving on.
+
+        :param stop: optional threading.Event, the loop returns once it is set
         :return:
         """
 
-        while True:
-            current_time = datetime.now()
+        next_report = self.clock.time()
+        while stop is None or not stop.is_set():
+            current_time = self.clock.now()
 
             # always update the temperature
             self.update_temperature()
 
-            if current_time.second % self.report_interval == 0:
+            now = self.clock.time()
+            if now >= next_report:
                 self.SetLiveReading(self.temperature, current_time)
+                next_report = max(next_report + self.report_interval, now)
+                if self.clock.lockstep:
+                    self.readings.join()
 
             # wait dt second
-            time.sleep(self.dt)
+            self.clock.sleep(self.dt)
+
+    async def run_async(self, readings: asyncio.Queue):
+        """
+
+        asyncio version of run. Ticks are scheduled against fixed deadlines (start + n*dt) on self.clock, so time
+        spent updating does not accumulate as drift and scaled or stepped clocks speed the loop up as they do for run.
+        Readings go to an asyncio.Queue, when it is full the oldest reading is dropped. With a lockstep clock the loop
+        waits for every reading to be marked done (readings.task_done()) before moving on.
+
+        :param readings: queue the LiveReadings are published to
+        """
+
+        clock = self.clock
+        start = clock.time()
+        next_report = start
+        ticks = 0
+        while True:
+            current_time = clock.now()
+            self.update_temperature()
+
+            now = clock.time()
+            if now >= next_report:
+                if readings.full():
+                    readings.get_nowait()
+                    readings.task_done()
+                readings.put_nowait(
+                    LiveReading(temperature=self.temperature, time=current_time,
+                                critical_temperature=self.critical_temperature, published_ns=time.perf_counter_ns()))
+                next_report = max(next_report + self.report_interval, now)
+                if clock.lockstep:
+                    await readings.join()
+
+            ticks += 1
+            await clock.sleep_async(max(start + ticks * self.dt - clock.time(), 0))
 
     # endregion
@@ -0,0 +1,224 @@
+import numpy as np
+
+from PID import PIDConfig, PIDController
+from Setpoints import Schedule
+from TankCooler import Cooler
+from TankMonitor import CanOfSoda
+
+# heater boost applied by CanOfSoda.update_temperature between minute 25 and 35 of every hour
+DISTURBANCE_HEAT = 4 / 60  # C/s
+DISTURBANCE_START = 25 * 60  # s
+DISTURBANCE_END = 35 * 60  # s
+DISTURBANCE_PERIOD = 60 * 60  # s
+
+
+class TankPlant:
+    def __init__(self, can: CanOfSoda, cooler: Cooler, cooler_param: float = 0.0, param_step: float = 0.1):
+        """
+
+        Connects a CanOfSoda to the Cooler that cools it so the pair can be driven by Simulation like a Transmitter.
+
+        The controller output only selects the direction the cooler param moves in: a positive output (tank colder
+        than the setpoint) lowers the cooler param by param_step, anything else raises it. The param is kept inside
+        cooler.param_range.
+
+        :param can: tank being controlled, its temperature is the process value
+        :param cooler: cooler whose param is adjusted
+        :param cooler_param: initial cooler param
+        :param param_step: change of cooler param per update
+        """
+
+        self.can = can
+        self.cooler = cooler
+        self.cooler_param = cooler_param
+        self.param_step = param_step
+
+    @property
+    def value(self) -> float:
+        return self.can.temperature
+
+    def update(self, new_value: float, dt: float) -> None:
+        low, high = self.cooler.param_range
+        if new_value > 0:
+            self.cooler_param = max(self.cooler_param - self.param_step, low)
+        else:
+            self.cooler_param = min(self.cooler_param + self.param_step, high)
+
+        self.cooler.set_cooler_param(self.cooler_param)
+        self.can.set_external_heat(self.cooler.get_cooling_rate())
+        self.can.dt = dt
+        self.can.update_temperature()
+
+    def snapshot(self) -> dict:
+        return {"can": self.can.snapshot(), "cooler": self.cooler.snapshot(), "cooler_param": self.cooler_param,
+                "param_step": self.param_step}
+
+    def restore(self, state: dict) -> None:
+        self.can.restore(state["can"])
+        self.cooler.restore(state["cooler"])
+        self.cooler_param = state["cooler_param"]
+        self.param_step = state["param_step"]
+
+    def fork(self) -> "TankPlant":
+        return TankPlant(self.can.fork(), self.cooler.fork(), self.cooler_param, self.param_step)
+
+    @staticmethod
+    def batch(plants: list["TankPlant"]) -> "TankPlantBatch":
+        return TankPlantBatch(plants)
+
+
+class TankPlantBatch:
+    def __init__(self, plants: list[TankPlant]):
+        """
+
+        Vectorised TankPlant, advances N tank/cooler pairs with one array update. Logging, critical temperature checks
+        and temperature history are skipped.
+
+        :param plants: plants to copy the initial state from, they are not modified
+        """
+
+        self.value = np.array([plant.can.temperature for plant in plants], dtype=float)
+        self.cooler_param = np.array([plant.cooler_param for plant in plants], dtype=float)
+        self.internal_time = np.array([plant.can.internal_time for plant in plants], dtype=float)
+
+        self._param_step = np.array([plant.param_step for plant in plants], dtype=float)
+        self._internal_heater = np.array([plant.can.internal_heater for plant in plants], dtype=float)
+        self._include_disturbance = np.array([plant.can.include_disturbance for plant in plants], dtype=bool)
+        self._low = np.array([plant.cooler.param_range[0] for plant in plants], dtype=float)
+        self._high = np.array([plant.cooler.param_range[1] for plant in plants], dtype=float)
+
+        tables = [plant.cooler.stage_table() for plant in plants]
+        self._thresholds = np.array([thresholds for _, thresholds, _ in tables], dtype=float)
+        self._rates = np.array([rates for _, _, rates in tables], dtype=float)
+
+    def update(self, new_value: np.ndarray, dt: float) -> None:
+        self.cooler_param = np.clip(
+            np.where(new_value > 0, self.cooler_param - self._param_step, self.cooler_param + self._param_step),
+            self._low, self._high)
+
+        # same stage selection as Cooler.cooling_rates, done per row
+        stage = np.sum(self.cooler_param[:, np.newaxis] >= self._thresholds, axis=1) + 1
+        stage = np.where(self.cooler_param <= self._low, 0, stage)
+        cooling_rate = np.take_along_axis(self._rates, stage[:, np.newaxis], axis=1)[:, 0]
+
+        self.internal_time = np.where(self._include_disturbance, self.internal_time + dt, self.internal_time)
+        phase = self.internal_time % DISTURBANCE_PERIOD
+        disturbed = self._include_disturbance & (DISTURBANCE_START <= phase) & (phase <= DISTURBANCE_END)
+        heater = np.where(disturbed, self._internal_heater + DISTURBANCE_HEAT, self._internal_heater)
+
+        self.value = self.value + heater*dt + cooling_rate*dt
+
+
+def simulate_tank(plant: TankPlant, pid_config: PIDConfig, number_of_steps: int, dt: float,
+                  setpoint=None, controller: PIDController = None,
+                  start_time: float = 0.0) -> tuple[np.ndarray, np.ndarray]:
+    """
+
+    Fused tank/cooler/controller loop. Gives the same result as driving the plant with a PIDController through
+    Simulation, but keeps all state in local floats and writes into preallocated arrays, so there is no per step
+    method dispatch, logging or list append. The plant objects are brought up to date once at the end, including
+    the tank temperature history.
+
+    :param plant: tank/cooler pair to advance
+    :param pid_config: controller gains, pid_config.setpoint is used when setpoint is None
+    :param number_of_steps: number of steps to take
+    :param dt: step size (s)
+    :param setpoint: optional array of number_of_steps setpoints, one per step, or a Schedule evaluated at the step
+        times start_time, start_time + dt, ...
+    :param controller: optional controller whose error, integral and derivative the loop starts from and is left
+        with, so a run can be continued in several calls or from a forked plant. Gains still come from pid_config.
+    :param start_time: time of the first step (s), e.g. the length of the prefix a forked plant continues from
+    :return: temperature and cooler param after every step
+    """
+
+    can = plant.can
+    cooler = plant.cooler
+
+    _, thresholds, rates = cooler.stage_table()
+    threshold_1, threshold_2, threshold_3 = thresholds
+    rate_1, rate_2, rate_3, rate_4, rate_5 = rates
+    low, high = cooler.param_range
+    k_p, k_i, k_d = pid_config.k_p, pid_config.k_i, pid_config.k_d
+    lower_bound, upper_bound = pid_config.lower_bound, pid_config.upper_bound
+    clamped = lower_bound < upper_bound
+    if isinstance(setpoint, Schedule):
+        setpoint = setpoint.values(start_time + np.arange(number_of_steps)*dt)
+    setpoints = np.full(number_of_steps, pid_config.setpoint) if setpoint is None else np.asarray(setpoint, dtype=float)
+    setpoints = setpoints.tolist()
+
+    temperature = can.temperature
+    internal_heater = can.internal_heater
+    internal_time = can.internal_time
+    include_disturbance = can.include_disturbance
+    cooler_param = plant.cooler_param
+    param_step = plant.param_step
+    previous_error = controller.error if controller is not None else 0.0
+    integral_error = controller.integral_error if controller is not None else 0.0
+    derivate_error = controller.derivate_error if controller is not None else 0.0
+    cooling_rate = can.external_heat_exchange
+
+    temperature_data = np.ndarray(number_of_steps)
+    param_data = np.ndarray(number_of_steps)
+
+    for i in range(number_of_steps):
+        error = setpoints[i] - temperature
+        integrated_error = integral_error + error*dt
+        derivate_error = (error - previous_error)/dt
+        output = k_p*error + k_i*integrated_error + k_d*derivate_error
+        previous_error = error
+
+        if clamped and output > upper_bound:
+            output = upper_bound
+            if k_i*error > 0:
+                integrated_error = integral_error
+        elif clamped and output < lower_bound:
+            output = lower_bound
+            if k_i*error < 0:
+                integrated_error = integral_error
+        integral_error = integrated_error
+
+        if output > 0:
+            cooler_param = cooler_param - param_step
+            if cooler_param < low:
+                cooler_param = low
+        else:
+            cooler_param = cooler_param + param_step
+            if cooler_param > high:
+                cooler_param = high
+
+        if cooler_param <= low:
+            cooling_rate = rate_1
+        elif cooler_param < threshold_1:
+            cooling_rate = rate_2
+        elif cooler_param < threshold_2:
+            cooling_rate = rate_3
+        elif cooler_param < threshold_3:
+            cooling_rate = rate_4
+        else:
+            cooling_rate = rate_5
+
+        heater = internal_heater
+        if include_disturbance:
+            internal_time += dt
+            if DISTURBANCE_START <= internal_time % DISTURBANCE_PERIOD <= DISTURBANCE_END:
+                heater = internal_heater + DISTURBANCE_HEAT
+
+        temperature = temperature + heater*dt + cooling_rate*dt
+
+        temperature_data[i] = temperature
+        param_data[i] = cooler_param
+
+    plant.cooler_param = cooler_param
+    cooler.cooler_param = cooler_param
+    can.external_heat_exchange = cooling_rate
+    can.internal_time = internal_time
+    can.dt = dt
+    can.temperature = temperature
+    can.check_temp_conditions()
+    can.extend_temperature_history(temperature_data)
+    if controller is not None:
+        controller.error = previous_error
+        controller.integral_error = integral_error
+        controller.derivate_error = derivate_error
+
+    return temperature_data, param_data
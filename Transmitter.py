@@ -1,4 +1,5 @@
 import dataclasses
+import numpy as np
 
 @dataclasses.dataclass
 class Transmitter:
@@ -6,4 +7,27 @@ class Transmitter:
     lag_time: float
 
     def update(self, new_value, dt):
-        self.value += dt/self.lag_time*new_value
\ No newline at end of file
+        self.value += dt/self.lag_time*new_value
+
+    def snapshot(self) -> dict:
+        return dataclasses.asdict(self)
+
+    def restore(self, state: dict) -> None:
+        self.value = state["value"]
+        self.lag_time = state["lag_time"]
+
+    def fork(self) -> "Transmitter":
+        return dataclasses.replace(self)
+
+    @staticmethod
+    def batch(transmitters: list["Transmitter"]) -> "TransmitterBatch":
+        return TransmitterBatch(transmitters)
+
+
+class TransmitterBatch:
+    def __init__(self, transmitters: list[Transmitter]):
+        self.value = np.array([transmitter.value for transmitter in transmitters], dtype=float)
+        self.lag_time = np.array([transmitter.lag_time for transmitter in transmitters], dtype=float)
+
+    def update(self, new_value: np.ndarray, dt: float) -> None:
+        self.value += dt/self.lag_time*new_value
\ No newline at end of file
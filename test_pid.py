@@ -0,0 +1,29 @@
+from datetime import datetime
+
+from PID import PIDConfig, PIDController
+from TankCooler import Cooler
+from TankFleet import TankLoop
+from TankMonitor import CanOfSoda, LiveReading
+
+
+def test_controllers_sharing_a_config_keep_their_own_setpoint():
+    config = PIDConfig(k_p=1.0, k_i=0.1, setpoint=20.0)
+    first = PIDController(config)
+    second = PIDController(config)
+
+    first.setpoint = 25.0
+
+    assert first.setpoint == 25.0
+    assert second.setpoint == 20.0
+    assert config.setpoint == 20.0
+
+
+def test_tank_loops_sharing_a_config_keep_their_own_setpoint():
+    config = PIDConfig(k_p=10.0, k_i=15.0, k_d=15.0, setpoint=1.0)
+    loops = [TankLoop(CanOfSoda(), Cooler(), PIDController(config), target=lambda reading, offset=i: 1.0 + offset)
+             for i in range(3)]
+    for loop in loops:
+        loop.control(LiveReading(temperature=3.0, time=datetime(2024, 1, 1), critical_temperature=5.0), 5.0)
+
+    assert [loop.controller.setpoint for loop in loops] == [1.0, 2.0, 3.0]
+    assert config.setpoint == 1.0
@@ -0,0 +1,20 @@
+import numpy as np
+
+from Simulation import SimulationConfig
+from StopConditions import Settled
+from Sweep import GainSweep, grid_gains
+from Transmitter import Transmitter
+
+
+def test_ranking_does_not_depend_on_chunk_size():
+    gains = grid_gains([0.1, 0.3, 5.0], [0.005, 0.05], [0.0, 0.05])
+    rankings = []
+    for chunk_size in (1, 4, 12):
+        sweep = GainSweep(SimulationConfig(run_time=200.0, delta_t=0.02), Transmitter(value=0.0, lag_time=5.0), 35.0,
+                          max_workers=1, chunk_size=chunk_size, stop_conditions=[Settled(band=0.02, duration=20.0)])
+        rankings.append(sweep.run(gains))
+
+    for ranking in rankings[1:]:
+        assert [(score.k_p, score.k_i, score.k_d) for score in ranking] == \
+               [(score.k_p, score.k_i, score.k_d) for score in rankings[0]]
+        np.testing.assert_allclose([score.ise for score in ranking], [score.ise for score in rankings[0]], rtol=1e-12)
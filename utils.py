@@ -1,19 +1,198 @@
-class dprinter:
-    def __init__(self, debug=False):
+import collections
+
+import numpy as np
+
+import Clock
+
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+
+_LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING"}
+
+
+class Logger:
+    def __init__(self, level=INFO, buffer_size=None, clock=None):
         """
 
-        A debug printer that operates based on a debug variable. For handling non-interrupt debug logging.
+        A level gated logger for hot loops. Messages are given as a %-style format string plus arguments and are only
+        formatted (and timestamped) when their level is enabled, so disabled calls cost a single comparison.
+
+        :param level: lowest level that is emitted, DEBUG, INFO or WARNING
+        :param buffer_size: if set, records are kept in an in-memory ring buffer of this many entries instead of being
+            printed to stdout
+        :param clock: Clock used for timestamps and rate limiting, defaults to real time. Give it the simulation's
+            ScaledClock or SteppedClock so intervals are measured in simulated seconds
+        """
+
+        self.level = level
+        self.clock = clock if clock is not None else Clock.RealClock()
+        self._buffer = collections.deque(maxlen=buffer_size) if buffer_size is not None else None
+        self._last_emit = {}
+
+    def is_enabled(self, level) -> bool:
+        return level >= self.level
+
+    def log(self, level, msg, *args, key=None, interval=None):
+        """
+        Emits msg % args at the given level.
 
-        :param debug: bool
+        :param level: message level
+        :param msg: %-style format string
+        :param args: format arguments, only applied when the message is emitted
+        :param key: identifies a repeated message for rate limiting
+        :param interval: with key, minimum number of clock seconds between two emits of that key. None emits
+            only the first time until reset(key) is called, which gives edge triggered messages
         """
 
-        self.debug = debug
+        if level < self.level:
+            return
 
-    def print(self, msg):
+        if key is not None:
+            now = self.clock.time()
+            last = self._last_emit.get(key)
+            if last is not None and (interval is None or now - last < interval):
+                return
+            self._last_emit[key] = now
+
+        record = (self.clock.now(), level, msg, args)
+        if self._buffer is not None:
+            self._buffer.append(record)
+        else:
+            print(self._format(record))
+
+    def reset(self, key):
         """
-        Print replacement method.
+        Forgets a rate limited key so its next message is emitted straight away.
 
-        :param msg: message to print
+        :param key: key passed to log
         """
-        if self.debug:
-            print(msg)
+
+        self._last_emit.pop(key, None)
+
+    def debug(self, msg, *args, **kwargs):
+        self.log(DEBUG, msg, *args, **kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        self.log(INFO, msg, *args, **kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+        self.log(WARNING, msg, *args, **kwargs)
+
+    @staticmethod
+    def _format(record) -> str:
+        timestamp, level, msg, args = record
+        return f"{timestamp} :: {_LEVEL_NAMES.get(level, level)}: {msg % args if args else msg}"
+
+    @property
+    def records(self) -> list:
+        """
+        :return: formatted messages held in the ring buffer, oldest first
+        """
+
+        if self._buffer is None:
+            return []
+        return [self._format(record) for record in self._buffer]
+
+
+class FloatHistory:
+    __slots__ = ("_data", "_start", "_stop", "_limit")
+
+    def __init__(self, values=(), limit=None, capacity=1024):
+        """
+
+        Growable float64 history stored in one contiguous NumPy buffer instead of a list of boxed floats. The buffer
+        doubles when full, so appends are amortised O(1), and view() exposes the stored values without copying.
+
+        :param values: initial values
+        :param limit: if set, only the most recent limit values are retained
+        :param capacity: initial buffer size
+        """
+
+        self._limit = limit
+        self._data = np.empty(max(capacity, 2 * limit if limit else 1))
+        self._start = 0
+        self._stop = 0
+        for value in values:
+            self.append(value)
+
+    def append(self, value):
+        if self._stop == len(self._data):
+            if self._limit is not None and self._stop - self._start >= self._limit:
+                # drop everything older than the retained window by sliding it to the front of a new buffer, views
+                # handed out earlier keep pointing at the old one
+                keep = self._limit - 1
+                data = np.empty(len(self._data))
+                data[:keep] = self._data[self._stop - keep:self._stop]
+                self._data = data
+                self._start = 0
+                self._stop = keep
+            else:
+                grown = np.empty(2 * len(self._data))
+                grown[:self._stop - self._start] = self._data[self._start:self._stop]
+                self._data = grown
+                self._stop -= self._start
+                self._start = 0
+
+        self._data[self._stop] = value
+        self._stop += 1
+        if self._limit is not None and self._stop - self._start > self._limit:
+            self._start += 1
+
+    def extend(self, values):
+        """
+        Appends many values with one array copy.
+
+        :param values: array-like of floats
+        """
+
+        values = np.asarray(values, dtype=float).ravel()
+        if self._limit is not None and len(values) > self._limit:
+            values = values[-self._limit:]
+
+        needed = len(self) + len(values)
+        if self._stop + len(values) > len(self._data):
+            size = len(self._data)
+            while size < needed:
+                size *= 2
+            grown = np.empty(size)
+            grown[:len(self)] = self._data[self._start:self._stop]
+            self._data = grown
+            self._stop = len(self)
+            self._start = 0
+
+        self._data[self._stop:self._stop + len(values)] = values
+        self._stop += len(values)
+        if self._limit is not None and self._stop - self._start > self._limit:
+            self._start = self._stop - self._limit
+
+    @property
+    def limit(self):
+        return self._limit
+
+    def view(self) -> np.ndarray:
+        """
+        :return: read-only array over the stored values, oldest first. It is not updated by later appends.
+        """
+
+        view = self._data[self._start:self._stop]
+        view.flags.writeable = False
+        return view
+
+    def clear(self):
+        self._data = np.empty(len(self._data))
+        self._start = 0
+        self._stop = 0
+
+    def __len__(self):
+        return self._stop - self._start
+
+    def __getitem__(self, item):
+        return self.view()[item]
+
+    def __iter__(self):
+        return iter(self.view())
+
+    def __array__(self, dtype=None, copy=None):
+        return self.view() if dtype is None else self.view().astype(dtype)